@@ -0,0 +1,318 @@
+"""
+Extraction Accuracy Evaluation
+Runs a labeled corpus through the pipeline stages offline, using recorded
+Comprehend Medical responses, and scores extracted codes against ground truth
+
+Usage:
+    python evaluation/evaluate.py samples/eval_manifest.csv [--output report.json]
+
+    # Serve Comprehend Medical from record/replay recordings of the actual
+    # (section-routed) requests instead of the manifest's response files;
+    # record them once with AWS_REPLAY_MODE=record
+    python evaluation/evaluate.py samples/eval_manifest.csv --recordings eval_recordings.db
+
+The manifest is a CSV with columns case_id, email, responses, ground_truth
+and response_source; paths are relative to the manifest. response_source is
+'recorded' for responses captured from Comprehend Medical and 'synthetic' for
+hand-built fixtures, whose scores are not a baseline. Ground truth files use
+the format of samples/ground_truth.csv.
+"""
+import argparse
+import csv
+import email
+import json
+import os
+import sys
+import time
+from email import policy
+import boto3
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The Lambda modules create boto3 clients at import time
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+for lambda_dir in ('shared', 'attachment_parser', 'comprehend_worker', 'ontology_mapper'):
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'lambda', lambda_dir))
+
+import parser as attachment_parser  # noqa: E402
+import worker  # noqa: E402
+import mapper  # noqa: E402
+import aws_replay  # noqa: E402
+
+DEFAULT_MAPPING = os.path.join(ROOT_DIR, 'mapping', 'snomed_icd10_map.csv')
+
+# Per-case stages, then the single corpus-wide scoring pass
+STAGES = ('parse', 'comprehend', 'mapping', 'scoring', 'corpus_scoring')
+
+
+class RecordedComprehendMedical:
+    """
+    Comprehend Medical client stub serving one stored response per API for
+    the full referral text. Entities whose text is absent from the request
+    are dropped and offsets recomputed, so any entity found anywhere in the
+    routed text is still returned: recall under section routing cannot be
+    measured with it. Use recordings (--recordings) for that.
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def detect_entities_v2(self, Text):
+        return self._respond('DetectEntitiesV2', Text)
+
+    def infer_icd10_cm(self, Text):
+        return self._respond('InferICD10CM', Text)
+
+    def infer_snomedct(self, Text):
+        return self._respond('InferSNOMEDCT', Text)
+
+    def infer_rx_norm(self, Text):
+        return self._respond('InferRxNorm', Text)
+
+    def _respond(self, operation, text):
+        entities = []
+        for entity in self.responses[operation]['Entities']:
+            begin = text.find(entity['Text'])
+            if begin >= 0:
+                entities.append({
+                    **entity,
+                    'BeginOffset': begin,
+                    'EndOffset': begin + len(entity['Text'])
+                })
+
+        return {**self.responses[operation], 'Entities': entities}
+
+
+class CsvMappingTable:
+    """DynamoDB ontology table stub backed by the mapping CSV"""
+
+    def __init__(self, path):
+        self.items = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                key = (row['entity_text'].lower(), row['entity_type'])
+                self.items[key] = {k: v or None for k, v in row.items()}
+
+    def get_item(self, Key):
+        item = self.items.get((Key['entity_text'], Key['entity_type']))
+        return {'Item': item} if item else {}
+
+
+def predicted_codes(structured, results):
+    """Extract (entity_type, code_system) -> set of codes from pipeline output"""
+    diagnosis_texts = {d['text'] for d in structured['diagnoses']}
+
+    codes = {
+        ('diagnosis', 'icd10'): {d.get('icd10_code') for d in structured['diagnoses']},
+        ('diagnosis', 'snomed'): {d.get('snomed_code') for d in structured['diagnoses']},
+        ('medication', 'rxnorm'): {m.get('rxnorm_code') for m in structured['medications']},
+        ('procedure', 'snomed'): {p.get('snomed_code') for p in structured['procedures']},
+        # SNOMED conditions that did not become diagnoses
+        ('symptom', 'snomed'): {
+            s['code'] for s in results.get('snomed', [])
+            if s['text'] not in diagnosis_texts
+        }
+    }
+
+    return {key: values - {None, ''} for key, values in codes.items()}
+
+
+def expected_codes(ground_truth_path):
+    """Read (entity_type, code_system) -> set of codes from a ground truth CSV"""
+    codes = {}
+
+    with open(ground_truth_path, newline='') as f:
+        for row in csv.DictReader(f):
+            entity_type = row['entity_type']
+            # The SNOMED column carries the RxNorm code for medication rows
+            snomed_system = 'rxnorm' if entity_type == 'medication' else 'snomed'
+
+            for column, system in (('expected_icd10', 'icd10'), ('expected_snomed', snomed_system)):
+                if row.get(column):
+                    codes.setdefault((entity_type, system), set()).add(row[column])
+
+    return codes
+
+
+def load_manifest(manifest_path):
+    """Read evaluation cases with paths resolved against the manifest"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    cases = []
+
+    with open(manifest_path, newline='') as f:
+        for row in csv.DictReader(f):
+            cases.append({
+                'case_id': row['case_id'],
+                'email': os.path.join(base_dir, row['email']),
+                'responses': os.path.join(base_dir, row['responses']),
+                'ground_truth': os.path.join(base_dir, row['ground_truth']),
+                'synthetic': row.get('response_source', 'recorded') == 'synthetic'
+            })
+
+    return cases
+
+
+def run_case(case, table, timings, client=None):
+    """
+    Run one case through parsing, Comprehend and mapping. client serves
+    Comprehend Medical; by default the case's response file is used.
+    """
+    start = time.perf_counter()
+    with open(case['email'], 'rb') as f:
+        msg = email.message_from_bytes(f.read(), policy=policy.default)
+    # Attachments need Textract and are not part of the offline run
+    text = attachment_parser.combine_text(attachment_parser.extract_email_body(msg), [])
+    timings['parse'].append(time.perf_counter() - start)
+
+    if client is None:
+        with open(case['responses']) as f:
+            client = RecordedComprehendMedical(json.load(f))
+
+    start = time.perf_counter()
+    results = worker.analyze_text(text, client=client)
+    timings['comprehend'].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    mapped_entities = mapper.map_entities(table, results['entities'])
+    structured = mapper.build_structured_data(case['case_id'], results, mapped_entities)
+    timings['mapping'].append(time.perf_counter() - start)
+
+    return predicted_codes(structured, results)
+
+
+def score(expected, predicted):
+    """
+    Compute precision/recall/F1 per (entity_type, code_system) with set
+    operations over (case_id, code) pairs for the whole corpus at once
+    """
+    metrics = {}
+
+    for key in sorted(set(expected) | set(predicted)):
+        exp = expected.get(key, set())
+        pred = predicted.get(key, set())
+
+        tp = len(exp & pred)
+        fp = len(pred - exp)
+        fn = len(exp - pred)
+
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+        metrics[f"{key[0]}/{key[1]}"] = {
+            'tp': tp,
+            'fp': fp,
+            'fn': fn,
+            'precision': round(precision, 4),
+            'recall': round(recall, 4),
+            'f1': round(f1, 4)
+        }
+
+    return metrics
+
+
+def recordings_client(path):
+    """
+    Comprehend Medical client replaying from a record/replay store, or
+    recording into it when AWS_REPLAY_MODE=record
+    """
+    mode = 'record' if aws_replay.REPLAY_MODE == 'record' else 'replay'
+    return aws_replay.wrap_client(
+        boto3.client('comprehendmedical'),
+        mode=mode,
+        store=aws_replay.get_store(path)
+    )
+
+
+def evaluate(manifest_path, mapping_path=DEFAULT_MAPPING, recordings_path=None):
+    """Evaluate every case in the manifest and return the report"""
+    table = CsvMappingTable(mapping_path)
+    client = recordings_client(recordings_path) if recordings_path else None
+    timings = {stage: [] for stage in STAGES}
+    expected = {}
+    predicted = {}
+
+    cases = load_manifest(manifest_path)
+    for case in cases:
+        case_predicted = run_case(case, table, timings, client)
+
+        start = time.perf_counter()
+        for key, codes in case_predicted.items():
+            predicted.setdefault(key, set()).update((case['case_id'], c) for c in codes)
+        for key, codes in expected_codes(case['ground_truth']).items():
+            expected.setdefault(key, set()).update((case['case_id'], c) for c in codes)
+        timings['scoring'].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    metrics = score(expected, predicted)
+    timings['corpus_scoring'].append(time.perf_counter() - start)
+
+    return {
+        'caseCount': len(cases),
+        'responseSource': 'recordings' if recordings_path else 'manifest',
+        # Response files marked synthetic; recordings always come from the service
+        'syntheticCaseCount': 0 if recordings_path else sum(case['synthetic'] for case in cases),
+        'metrics': metrics,
+        'timingsMs': {
+            stage: {
+                'total': round(sum(values) * 1000, 3),
+                'mean': round(sum(values) * 1000 / len(values), 3) if values else 0.0
+            }
+            for stage, values in timings.items()
+        }
+    }
+
+
+def print_report(report):
+    """Print the report as plain-text tables"""
+    print(f"Cases: {report['caseCount']} (Comprehend responses from {report['responseSource']})")
+    if report['syntheticCaseCount']:
+        print(
+            f"Warning: {report['syntheticCaseCount']} case(s) use synthetic Comprehend "
+            "responses; these scores are not a baseline for real extraction accuracy"
+        )
+    print()
+
+    print(
+        f"{'entity/system':<20} {'tp':>4} {'fp':>4} {'fn':>4} "
+        f"{'prec':>7} {'recall':>7} {'f1':>7}"
+    )
+    for key, m in report['metrics'].items():
+        print(
+            f"{key:<20} {m['tp']:>4} {m['fp']:>4} {m['fn']:>4} "
+            f"{m['precision']:>7.3f} {m['recall']:>7.3f} {m['f1']:>7.3f}"
+        )
+
+    print(f"\n{'stage':<20} {'total ms':>10} {'mean ms':>10}")
+    for stage, t in report['timingsMs'].items():
+        print(f"{stage:<20} {t['total']:>10.3f} {t['mean']:>10.3f}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('manifest', help='Evaluation manifest CSV')
+    arg_parser.add_argument('--mapping', default=DEFAULT_MAPPING, help='Ontology mapping CSV')
+    arg_parser.add_argument('--output', help='Write the JSON report to this path')
+    arg_parser.add_argument(
+        '--recordings',
+        help='Record/replay store to serve Comprehend Medical from '
+             '(see lambda/shared/aws_replay.py)'
+    )
+    args = arg_parser.parse_args()
+
+    try:
+        report = evaluate(args.manifest, args.mapping, args.recordings)
+    except aws_replay.ReplayMissError as e:
+        sys.exit(
+            f"{e}\nRecordings only cover the requests made when recording; re-record with "
+            "AWS_REPLAY_MODE=record after changing the corpus or SECTION_ROUTING settings"
+        )
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
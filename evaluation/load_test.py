@@ -0,0 +1,189 @@
+"""
+Offline Load Test
+Drives the parse (including Textract for attachments), Comprehend and
+mapping stages at high volume against AWS responses served by the
+record/replay layer (lambda/shared/aws_replay.py)
+
+Usage:
+    # Capture responses once against the real services; attachments are
+    # uploaded to the bucket so Textract can read them
+    AWS_REPLAY_MODE=record python evaluation/load_test.py samples/eval_manifest.csv \\
+        --bucket my-scratch-bucket
+
+    # Replay at 100x with sampled latency and a 20 req/s per-operation quota
+    AWS_REPLAY_MODE=replay AWS_REPLAY_LATENCY=lognormal:250:0.4 \\
+    AWS_REPLAY_RATE_LIMIT=20 \\
+        python evaluation/load_test.py samples/eval_manifest.csv --bucket my-scratch-bucket \\
+        --repeat 100 --workers 32
+
+Replay only needs the bucket name, since Textract requests are keyed by S3
+location; it must match the bucket used when recording.
+"""
+import argparse
+import email
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email import policy
+from botocore.exceptions import ClientError
+
+from evaluate import (
+    DEFAULT_MAPPING,
+    CsvMappingTable,
+    attachment_parser,
+    load_manifest,
+    mapper,
+    worker
+)
+from aws_replay import REPLAY_MODE, ReplayMissError, replay_stats
+
+
+def list_attachments(msg, message_id):
+    """Attachments as the parser stores them, without uploading to S3"""
+    attachments = []
+
+    for part in msg.walk():
+        if part.get_content_maintype() == 'multipart':
+            continue
+        if part.get('Content-Disposition') is None:
+            continue
+
+        filename = part.get_filename()
+        if filename:
+            attachments.append({
+                'filename': filename,
+                'content_type': part.get_content_type(),
+                's3_key': attachment_parser.attachment_key(message_id, filename)
+            })
+
+    return attachments
+
+
+def run_referral(case, table, bucket):
+    """
+    Run one referral through the pipeline stages.
+    Returns (stage timings, whether every attachment yielded text). A
+    referral whose attachment text is missing stops after parsing: its
+    Comprehend requests would differ from the recorded ones.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    with open(case['email'], 'rb') as f:
+        msg = email.message_from_bytes(f.read(), policy=policy.default)
+
+    if REPLAY_MODE == 'record':
+        attachments = attachment_parser.extract_attachments(msg, bucket, case['case_id'])
+    else:
+        attachments = list_attachments(msg, case['case_id'])
+
+    extracted_texts = []
+    for attachment in attachments:
+        if attachment['content_type'] in attachment_parser.TEXTRACT_CONTENT_TYPES:
+            extracted_texts.append({
+                'filename': attachment['filename'],
+                # Returns '' on any Textract error, as in the Lambda
+                'text': attachment_parser.process_with_textract(bucket, attachment['s3_key'])
+            })
+
+    text = attachment_parser.combine_text(
+        attachment_parser.extract_email_body(msg),
+        extracted_texts
+    )
+    timings['parse'] = time.perf_counter() - start
+
+    if not all(item['text'] for item in extracted_texts):
+        return timings, False
+
+    start = time.perf_counter()
+    results = worker.analyze_text(text)
+    timings['comprehend'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mapped_entities = mapper.map_entities(table, results['entities'])
+    mapper.build_structured_data(case['case_id'], results, mapped_entities)
+    timings['mapping'] = time.perf_counter() - start
+
+    return timings, True
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of pre-sorted values"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, int(round(pct / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+def load_test(manifest_path, bucket, repeat=1, workers=1, mapping_path=DEFAULT_MAPPING):
+    """Run every case repeat times across worker threads and summarize"""
+    table = CsvMappingTable(mapping_path)
+    cases = load_manifest(manifest_path) * repeat
+    # partial: an attachment's Textract call failed and the parser carried
+    # on without its text; only completed referrals count towards latency
+    outcomes = {'completed': 0, 'partial': 0, 'throttled': 0, 'missing': 0, 'failed': 0}
+    stage_timings = {'parse': [], 'comprehend': [], 'mapping': [], 'total': []}
+
+    def run(case):
+        try:
+            timings, complete = run_referral(case, table, bucket)
+            return ('completed' if complete else 'partial'), timings
+        except ReplayMissError:
+            return 'missing', None
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ThrottlingException':
+                return 'throttled', None
+            return 'failed', None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for outcome, timings in executor.map(run, cases):
+            outcomes[outcome] += 1
+            if outcome == 'completed':
+                for stage, seconds in timings.items():
+                    stage_timings[stage].append(seconds)
+                stage_timings['total'].append(sum(timings.values()))
+    elapsed = time.perf_counter() - start
+
+    latency_ms = {}
+    for stage, values in stage_timings.items():
+        values.sort()
+        latency_ms[stage] = {
+            'p50': round(percentile(values, 50) * 1000, 3),
+            'p95': round(percentile(values, 95) * 1000, 3),
+            'p99': round(percentile(values, 99) * 1000, 3)
+        }
+
+    return {
+        'referrals': len(cases),
+        'workers': workers,
+        'elapsedSeconds': round(elapsed, 3),
+        'throughputPerSecond': round(len(cases) / elapsed, 2) if elapsed else 0.0,
+        'outcomes': outcomes,
+        'latencyMs': latency_ms,
+        # Per operation; throttled counts calls that used up every retry
+        'replay': replay_stats()
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('manifest', help='Evaluation manifest CSV')
+    arg_parser.add_argument(
+        '--bucket',
+        default=os.environ.get('S3_BUCKET'),
+        required='S3_BUCKET' not in os.environ,
+        help='Bucket holding attachments for Textract (default $S3_BUCKET)'
+    )
+    arg_parser.add_argument('--repeat', type=int, default=1, help='Times to run each case')
+    arg_parser.add_argument('--workers', type=int, default=1, help='Concurrent referrals')
+    arg_parser.add_argument('--mapping', default=DEFAULT_MAPPING, help='Ontology mapping CSV')
+    args = arg_parser.parse_args()
+
+    report = load_test(args.manifest, args.bucket, args.repeat, args.workers, args.mapping)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Query Benchmark
+Times the common diagnosis/medication queries against a PostgreSQL database
+and reports which partitions and scan types each plan uses
+
+Usage:
+    # Optionally fill a scratch database with synthetic rows first
+    python evaluation/query_benchmark.py --dsn "host=localhost dbname=medextract" \\
+        --populate 10000000 --patients 200000 --months 24
+
+Connection settings default to the standard libpq PG* environment variables.
+Date windows are passed as parameters rather than NOW() - INTERVAL, so the
+planner prunes partitions at plan time instead of planning every partition.
+Populating writes BENCH-prefixed patients and rebuilds the summary tables;
+do not run it against a production database.
+"""
+import argparse
+import json
+import statistics
+import time
+import psycopg2
+
+# Window starts come from query_params()
+QUERIES = {
+    'patient_recent_diagnoses': """
+        SELECT created_at, icd10_code, snomed_code
+        FROM diagnoses
+        WHERE patient_id = %(patient_id)s
+          AND created_at >= %(since_90d)s
+        ORDER BY created_at DESC
+        LIMIT 50
+    """,
+    'patient_recent_medications': """
+        SELECT created_at, rxnorm_code
+        FROM medications
+        WHERE patient_id = %(patient_id)s
+          AND created_at >= %(since_90d)s
+        ORDER BY created_at DESC
+        LIMIT 50
+    """,
+    'icd10_frequency_30d': """
+        SELECT icd10_code, COUNT(*)
+        FROM diagnoses
+        WHERE created_at >= %(since_30d)s
+        GROUP BY icd10_code
+        ORDER BY COUNT(*) DESC
+        LIMIT 20
+    """,
+    'icd10_patients_30d': """
+        SELECT COUNT(DISTINCT patient_id)
+        FROM diagnoses
+        WHERE icd10_code = %(icd10_code)s
+          AND created_at >= %(since_30d)s
+    """,
+    'patient_summary_lookup': """
+        SELECT * FROM patient_summary WHERE id = %(patient_id)s
+    """
+}
+
+# Skewed code distributions so a few codes dominate, as in real referrals
+POPULATE_SQL = [
+    """
+    SELECT create_entity_partitions(
+        (CURRENT_DATE - make_interval(months => %(months)s))::date,
+        (CURRENT_DATE + INTERVAL '3 months')::date
+    )
+    """,
+    """
+    INSERT INTO patients (mrn, name, created_at, updated_at)
+    SELECT 'BENCH' || g, 'Benchmark Patient ' || g, NOW(), NOW()
+    FROM generate_series(1, %(patients)s) g
+    ON CONFLICT (mrn) DO NOTHING
+    """,
+    """
+    INSERT INTO diagnoses
+        (patient_id, diagnosis_text, icd10_code, snomed_code, confidence, created_at)
+    SELECT
+        p.id,
+        'Benchmark diagnosis',
+        'E' || lpad((power(random(), 3) * 99)::int::text, 2, '0') || '.9',
+        (100000 + (power(random(), 3) * 5000)::int)::text,
+        random(),
+        NOW() - random() * make_interval(months => %(months)s)
+    FROM (
+        SELECT 1 + (random() * (%(patients)s - 1))::int as n
+        FROM generate_series(1, %(rows)s)
+    ) g
+    JOIN patients p ON p.mrn = 'BENCH' || g.n
+    """,
+    """
+    INSERT INTO medications (patient_id, medication_name, rxnorm_code, confidence, created_at)
+    SELECT
+        p.id,
+        'Benchmark medication',
+        (1000 + (power(random(), 3) * 2000)::int)::text,
+        random(),
+        NOW() - random() * make_interval(months => %(months)s)
+    FROM (
+        SELECT 1 + (random() * (%(patients)s - 1))::int as n
+        FROM generate_series(1, %(rows)s)
+    ) g
+    JOIN patients p ON p.mrn = 'BENCH' || g.n
+    """,
+    "SELECT rebuild_summary_tables()",
+    "ANALYZE patients",
+    "ANALYZE diagnoses",
+    "ANALYZE medications"
+]
+
+
+def populate(conn, rows, patients, months):
+    """Insert synthetic patients, diagnoses and medications"""
+    params = {'rows': rows, 'patients': patients, 'months': months}
+    cursor = conn.cursor()
+
+    for sql in POPULATE_SQL:
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        conn.commit()
+        print(f"{' '.join(sql.split())[:60]}... {time.perf_counter() - start:.1f}s")
+
+
+def query_params(conn):
+    """
+    Pick a patient with history and the most frequent recent ICD-10 code,
+    and compute the date windows from the server clock
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT LOCALTIMESTAMP - INTERVAL '90 days', LOCALTIMESTAMP - INTERVAL '30 days'
+    """)
+    since_90d, since_30d = cursor.fetchone()
+
+    cursor.execute("""
+        SELECT patient_id FROM patient_summary_counts
+        ORDER BY diagnosis_count DESC
+        LIMIT 1
+    """)
+    row = cursor.fetchone()
+    patient_id = row[0] if row else 0
+
+    cursor.execute("""
+        SELECT icd10_code FROM diagnoses
+        WHERE created_at >= %s
+        GROUP BY icd10_code
+        ORDER BY COUNT(*) DESC
+        LIMIT 1
+    """, (since_30d,))
+    row = cursor.fetchone()
+    icd10_code = row[0] if row else ''
+
+    return {
+        'patient_id': patient_id,
+        'icd10_code': icd10_code,
+        'since_90d': since_90d,
+        'since_30d': since_30d
+    }
+
+
+def plan_summary(plan):
+    """Collect scanned relations and node types from an EXPLAIN JSON plan"""
+    relations = set()
+    node_types = set()
+    stack = [plan]
+
+    while stack:
+        node = stack.pop()
+        node_types.add(node['Node Type'])
+        if 'Relation Name' in node:
+            relations.add(node['Relation Name'])
+        stack.extend(node.get('Plans', []))
+
+    return sorted(relations), sorted(node_types)
+
+
+def benchmark(conn, iterations):
+    """Time each query and summarize its plan"""
+    params = query_params(conn)
+    cursor = conn.cursor()
+    results = {}
+
+    for name, sql in QUERIES.items():
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+        explain = cursor.fetchone()[0][0]
+        relations, node_types = plan_summary(explain['Plan'])
+
+        timings.sort()
+        results[name] = {
+            'medianMs': round(statistics.median(timings), 3),
+            'p95Ms': round(timings[max(0, int(round(0.95 * len(timings))) - 1)], 3),
+            'relationsScanned': relations,
+            'nodeTypes': node_types
+        }
+
+    conn.rollback()
+
+    return {'params': params, 'iterations': iterations, 'queries': results}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--dsn', default='', help='libpq connection string')
+    arg_parser.add_argument(
+        '--populate', type=int, default=0, help='Synthetic rows per entity table'
+    )
+    arg_parser.add_argument('--patients', type=int, default=100000, help='Synthetic patients')
+    arg_parser.add_argument(
+        '--months', type=int, default=24, help='Months of history to spread rows over'
+    )
+    arg_parser.add_argument('--iterations', type=int, default=20, help='Timed runs per query')
+    args = arg_parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        if args.populate:
+            populate(conn, args.populate, args.patients, args.months)
+        print(json.dumps(benchmark(conn, args.iterations), indent=2, default=str))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
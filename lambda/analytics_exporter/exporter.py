@@ -0,0 +1,299 @@
+"""
+Analytics Exporter Lambda
+Exports structured referral data to partitioned Parquet for columnar analytics
+"""
+import json
+import boto3
+import os
+import io
+import hashlib
+from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+s3_client = boto3.client('s3')
+
+ANALYTICS_BUCKET = os.environ.get('ANALYTICS_BUCKET')
+ANALYTICS_PREFIX = os.environ.get('ANALYTICS_PREFIX', 'analytics')
+COMPACTION_MIN_FILES = int(os.environ.get('COMPACTION_MIN_FILES', '10'))
+COMPACTION_TARGET_BYTES = int(os.environ.get('COMPACTION_TARGET_BYTES', str(128 * 1024 * 1024)))
+
+# Parquet key-value metadata listing the files a compacted file replaced
+SOURCE_KEYS_METADATA = b'medextract.source_keys'
+
+# Columns per entity type; code columns are dictionary encoded since they
+# repeat heavily across referrals
+ENTITY_SCHEMAS = {
+    'diagnosis': pa.schema([
+        ('message_id', pa.string()),
+        ('patient_mrn', pa.string()),
+        ('text', pa.string()),
+        ('icd10_code', pa.string()),
+        ('snomed_code', pa.string()),
+        ('description', pa.string()),
+        ('confidence', pa.float64()),
+        ('exported_at', pa.timestamp('ms'))
+    ]),
+    'medication': pa.schema([
+        ('message_id', pa.string()),
+        ('patient_mrn', pa.string()),
+        ('name', pa.string()),
+        ('rxnorm_code', pa.string()),
+        ('description', pa.string()),
+        ('confidence', pa.float64()),
+        ('exported_at', pa.timestamp('ms'))
+    ]),
+    'procedure': pa.schema([
+        ('message_id', pa.string()),
+        ('patient_mrn', pa.string()),
+        ('name', pa.string()),
+        ('type', pa.string()),
+        ('snomed_code', pa.string()),
+        ('confidence', pa.float64()),
+        ('exported_at', pa.timestamp('ms'))
+    ])
+}
+
+DICTIONARY_COLUMNS = {
+    'diagnosis': ['icd10_code', 'snomed_code'],
+    'medication': ['rxnorm_code'],
+    'procedure': ['type', 'snomed_code']
+}
+
+# Keys of the structured payload holding each entity type
+ENTITY_SOURCES = {
+    'diagnosis': 'diagnoses',
+    'medication': 'medications',
+    'procedure': 'procedures'
+}
+
+
+def lambda_handler(event, context):
+    """
+    Export structured data to Parquet, or compact a day of small files
+    """
+    print(f"Received event: {json.dumps(event)}")
+
+    try:
+        if event.get('action') == 'compact':
+            return compact_handler(event)
+
+        message_id = event['messageId']
+        data = event['data']
+        bucket = ANALYTICS_BUCKET or event['s3Bucket']
+        exported_at = datetime.utcnow()
+
+        written = {}
+        for entity_type in ENTITY_SCHEMAS:
+            rows = build_rows(entity_type, data, message_id, exported_at)
+            if not rows:
+                continue
+
+            key = partition_key(entity_type, exported_at.date(), f"{message_id}.parquet")
+            write_parquet(bucket, key, entity_type, rows)
+            written[entity_type] = len(rows)
+
+        print(f"Exported analytics data for message {message_id}: {written}")
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Analytics export completed',
+                'messageId': message_id,
+                'rowCounts': written
+            })
+        }
+
+    except Exception as e:
+        print(f"Error exporting analytics data: {str(e)}")
+        raise
+
+
+def compact_handler(event):
+    """Merge small Parquet files within each partition of a given date"""
+    bucket = ANALYTICS_BUCKET or event['s3Bucket']
+    if 'date' in event:
+        date = datetime.strptime(event['date'], '%Y-%m-%d').date()
+    else:
+        date = (datetime.utcnow() - timedelta(days=1)).date()
+
+    results = {}
+    for entity_type in event.get('entityTypes', list(ENTITY_SCHEMAS)):
+        results[entity_type] = compact_partition(bucket, entity_type, date)
+
+    print(f"Compaction completed for {date.isoformat()}: {results}")
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'Compaction completed',
+            'date': date.isoformat(),
+            'results': results
+        })
+    }
+
+
+def build_rows(entity_type, data, message_id, exported_at):
+    """Flatten one entity list of the structured payload into table rows"""
+    patient_mrn = data.get('patient', {}).get('mrn', message_id)
+    schema = ENTITY_SCHEMAS[entity_type]
+    rows = []
+
+    for entity in data.get(ENTITY_SOURCES[entity_type], []):
+        row = {
+            'message_id': message_id,
+            'patient_mrn': patient_mrn,
+            'exported_at': exported_at
+        }
+        for field in schema.names:
+            if field not in row:
+                row[field] = entity.get(field)
+        if row.get('confidence') is not None:
+            row['confidence'] = float(row['confidence'])
+        rows.append(row)
+
+    return rows
+
+
+def partition_key(entity_type, date, filename):
+    """Build the Hive-style partitioned S3 key for a Parquet file"""
+    return (
+        f"{ANALYTICS_PREFIX}/entity_type={entity_type}/"
+        f"date={date.isoformat()}/{filename}"
+    )
+
+
+def write_parquet(bucket, key, entity_type, rows):
+    """Write rows as a Parquet object to S3"""
+    table = pa.Table.from_pylist(rows, schema=ENTITY_SCHEMAS[entity_type])
+    put_table(bucket, key, entity_type, table)
+
+
+def put_table(bucket, key, entity_type, table):
+    """Serialize an Arrow table to Parquet and upload it"""
+    buffer = io.BytesIO()
+    pq.write_table(
+        table,
+        buffer,
+        compression='snappy',
+        use_dictionary=DICTIONARY_COLUMNS[entity_type]
+    )
+
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=buffer.getvalue(),
+        ContentType='application/vnd.apache.parquet'
+    )
+
+
+def list_partition(bucket, entity_type, date):
+    """List Parquet objects in a partition"""
+    prefix = partition_key(entity_type, date, '')
+    objects = []
+
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith('.parquet'):
+                objects.append(obj)
+
+    return objects
+
+
+def compact_partition(bucket, entity_type, date):
+    """
+    Merge small files of one partition into files near the target size.
+    Each compacted file records its sources, so files left behind by an
+    interrupted run are deleted instead of being merged a second time.
+    """
+    objects = list_partition(bucket, entity_type, date)
+
+    covered = set()
+    for obj in objects:
+        if obj['Key'].rsplit('/', 1)[-1].startswith('compacted-'):
+            covered.update(compacted_sources(bucket, obj['Key']))
+
+    stale = [obj['Key'] for obj in objects if obj['Key'] in covered]
+    delete_keys(bucket, stale)
+
+    small_files = [
+        obj for obj in objects
+        if obj['Key'] not in covered and obj['Size'] < COMPACTION_TARGET_BYTES
+    ]
+
+    if len(small_files) < COMPACTION_MIN_FILES:
+        return {'merged': 0, 'written': 0, 'cleaned': len(stale)}
+
+    merged_count = 0
+    written = 0
+    for batch in batch_by_size(small_files, COMPACTION_TARGET_BYTES):
+        if len(batch) < 2:
+            continue
+
+        tables = []
+        for obj in batch:
+            response = s3_client.get_object(Bucket=bucket, Key=obj['Key'])
+            tables.append(pq.read_table(io.BytesIO(response['Body'].read())))
+
+        source_keys = sorted(obj['Key'] for obj in batch)
+        merged = pa.concat_tables(tables).cast(ENTITY_SCHEMAS[entity_type])
+        merged = merged.replace_schema_metadata({SOURCE_KEYS_METADATA: json.dumps(source_keys)})
+        put_table(bucket, compacted_key(entity_type, date, source_keys), entity_type, merged)
+
+        # Only remove sources once the merged file is in place
+        delete_keys(bucket, source_keys)
+        merged_count += len(batch)
+        written += 1
+
+    return {'merged': merged_count, 'written': written, 'cleaned': len(stale)}
+
+
+def compacted_key(entity_type, date, source_keys):
+    """Key of the file merging source_keys; a retried merge overwrites it"""
+    digest = hashlib.sha256('\n'.join(source_keys).encode('utf-8')).hexdigest()[:32]
+    return partition_key(entity_type, date, f"compacted-{digest}.parquet")
+
+
+def compacted_sources(bucket, key):
+    """Read the source keys from a compacted file's Parquet footer"""
+    # The file ends with the footer, its 4-byte length and the PAR1 magic
+    tail = s3_client.get_object(Bucket=bucket, Key=key, Range='bytes=-8')['Body'].read()
+    footer_length = int.from_bytes(tail[:4], 'little')
+    footer = s3_client.get_object(
+        Bucket=bucket,
+        Key=key,
+        Range=f"bytes=-{footer_length + 8}"
+    )['Body'].read()
+
+    metadata = pq.read_metadata(io.BytesIO(footer)).metadata or {}
+    return json.loads(metadata.get(SOURCE_KEYS_METADATA, b'[]'))
+
+
+def delete_keys(bucket, keys):
+    """Delete objects (DeleteObjects accepts at most 1000 keys per call)"""
+    for i in range(0, len(keys), 1000):
+        s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in keys[i:i + 1000]]}
+        )
+
+
+def batch_by_size(objects, target_bytes):
+    """Group objects into batches whose total size stays under the target"""
+    batches = []
+    current = []
+    current_size = 0
+
+    for obj in objects:
+        if current and current_size + obj['Size'] > target_bytes:
+            batches.append(current)
+            current = []
+            current_size = 0
+        current.append(obj)
+        current_size += obj['Size']
+
+    if current:
+        batches.append(current)
+
+    return batches
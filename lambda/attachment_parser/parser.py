@@ -8,13 +8,22 @@ import os
 import email
 from email import policy
 import io
+try:
+    from aws_replay import wrap_client
+except ImportError:
+    # aws_replay is only bundled for offline record/replay runs
+    def wrap_client(client):
+        return client
 
 s3_client = boto3.client('s3')
-textract_client = boto3.client('textract')
+textract_client = wrap_client(boto3.client('textract'))
 lambda_client = boto3.client('lambda')
 
 COMPREHEND_FUNCTION = os.environ.get('COMPREHEND_FUNCTION', 'medextract-pipeline-comprehend')
 
+# Attachment types sent to Textract
+TEXTRACT_CONTENT_TYPES = ['application/pdf', 'image/png', 'image/jpeg']
+
 
 def lambda_handler(event, context):
     """
@@ -30,6 +39,8 @@ def lambda_handler(event, context):
         # Download email from S3
         response = s3_client.get_object(Bucket=s3_bucket, Key=s3_key)
         email_content = response['Body'].read()
+        # SES wrote the email when it arrived; the loader measures processing time from it
+        received_at = response['LastModified'].isoformat()
         
         # Parse email
         msg = email.message_from_bytes(email_content, policy=policy.default)
@@ -44,7 +55,7 @@ def lambda_handler(event, context):
         extracted_texts = []
         
         for attachment in attachments:
-            if attachment['content_type'] in ['application/pdf', 'image/png', 'image/jpeg']:
+            if attachment['content_type'] in TEXTRACT_CONTENT_TYPES:
                 text = process_with_textract(s3_bucket, attachment['s3_key'])
                 extracted_texts.append({
                     'filename': attachment['filename'],
@@ -52,9 +63,7 @@ def lambda_handler(event, context):
                 })
         
         # Combine all text
-        combined_text = f"Email Body:\n{email_body}\n\n"
-        for item in extracted_texts:
-            combined_text += f"\nAttachment: {item['filename']}\n{item['text']}\n"
+        combined_text = combine_text(email_body, extracted_texts)
         
         # Store extracted text
         text_key = f"extracted/{message_id}.txt"
@@ -72,7 +81,8 @@ def lambda_handler(event, context):
             'messageId': message_id,
             's3Bucket': s3_bucket,
             'textKey': text_key,
-            'text': combined_text[:10000]  # Limit size for Lambda payload
+            'text': combined_text[:10000],  # Limit size for Lambda payload
+            'receivedAt': received_at
         }
         
         lambda_client.invoke(
@@ -112,6 +122,15 @@ def extract_email_body(msg):
     return body
 
 
+def combine_text(email_body, extracted_texts):
+    """Combine email body and attachment text into one document"""
+    combined_text = f"Email Body:\n{email_body}\n\n"
+    for item in extracted_texts:
+        combined_text += f"\nAttachment: {item['filename']}\n{item['text']}\n"
+    
+    return combined_text
+
+
 def extract_attachments(msg, s3_bucket, message_id):
     """Extract and store attachments"""
     attachments = []
@@ -128,7 +147,7 @@ def extract_attachments(msg, s3_bucket, message_id):
             content_type = part.get_content_type()
             
             # Store attachment in S3
-            s3_key = f"attachments/{message_id}/{filename}"
+            s3_key = attachment_key(message_id, filename)
             s3_client.put_object(
                 Bucket=s3_bucket,
                 Key=s3_key,
@@ -148,6 +167,11 @@ def extract_attachments(msg, s3_bucket, message_id):
     return attachments
 
 
+def attachment_key(message_id, filename):
+    """S3 key an attachment is stored under"""
+    return f"attachments/{message_id}/{filename}"
+
+
 def process_with_textract(bucket, key):
     """Process document with Amazon Textract"""
     try:
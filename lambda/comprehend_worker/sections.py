@@ -0,0 +1,188 @@
+"""
+Referral Section Classifier
+Splits referral text into sections and routes each section only to the
+Comprehend Medical APIs likely to yield results for it
+"""
+import re
+
+COMPREHEND_APIS = ('detect_entities_v2', 'infer_icd10_cm', 'infer_snomedct', 'infer_rx_norm')
+
+# Section type -> APIs that receive its text. Unclassified text ('other')
+# goes to every API so recall never depends on the classifier. History and
+# assessment keep InferRxNorm for free-text mentions ("started on ramipril")
+# until recorded routing-on/off runs show it can be dropped.
+DEFAULT_ROUTING = {
+    'demographics': ['detect_entities_v2'],
+    'history': list(COMPREHEND_APIS),
+    'medications': ['infer_rx_norm'],
+    'investigations': ['detect_entities_v2', 'infer_icd10_cm', 'infer_snomedct'],
+    'assessment': list(COMPREHEND_APIS),
+    'social': ['detect_entities_v2'],
+    'boilerplate': [],
+    'other': list(COMPREHEND_APIS)
+}
+
+# Checked in order; the first match classifies a heading
+HEADING_TYPES = [
+    ('demographics', re.compile(r'patient (details|information|demographics)|demographics', re.I)),
+    ('social', re.compile(r'social|lifestyle', re.I)),
+    ('medications', re.compile(r'medication|prescri|drug|repeat items', re.I)),
+    ('investigations', re.compile(
+        r'investigation|results|observation|examination|bloods|labs?\b', re.I
+    )),
+    ('history', re.compile(
+        r'history|summary|symptom|co-?morbid|presenting|problem|diagnos|background', re.I
+    )),
+    ('assessment', re.compile(r'assessment|impression|plan|reason for referral|request', re.I))
+]
+
+# A heading is a short label alone on its line, ending in a colon
+HEADING_LINE = re.compile(r'^\s*([A-Za-z][A-Za-z0-9 /&()-]{1,40}):\s*$')
+SOURCE_LINE = re.compile(r'^(Email Body|Attachment):')
+SALUTATION_LINE = re.compile(r'^\s*dear\b', re.I)
+SIGN_OFF_LINE = re.compile(
+    r'^\s*((kind|best|warm)\s+regards|regards,|many thanks|'
+    r'yours\s+(sincerely|faithfully)|best wishes)',
+    re.I
+)
+HEADER_LINE = re.compile(r'^\s*(From|Sent|To|Cc|Date|Subject):\s', re.I)
+FORWARD_LINE = re.compile(r'^\s*-{2,}\s*(original message|forwarded message)', re.I)
+DISCLAIMER_LINE = re.compile(
+    r'this e-?mail (and any attachments )?(is|are|may be) (confidential|intended)|'
+    r'intended (solely|only) for the (use of the )?(addressee|recipient)|'
+    r'(received|receive) this (e-?mail|message) in error',
+    re.I
+)
+
+
+def validate_routing(routing):
+    """
+    Check routing overrides name known section types and APIs.
+    Returns the overrides; raises ValueError on unknown names.
+    """
+    if not isinstance(routing, dict):
+        raise ValueError("Routing policy must map section types to lists of APIs")
+
+    for section_type, apis in routing.items():
+        if section_type not in DEFAULT_ROUTING:
+            raise ValueError(
+                f"Unknown section type in routing policy: {section_type} "
+                f"(expected one of {', '.join(DEFAULT_ROUTING)})"
+            )
+        if not isinstance(apis, list):
+            raise ValueError(f"Routing for {section_type} must be a list of APIs")
+        for api in apis:
+            if api not in COMPREHEND_APIS:
+                raise ValueError(
+                    f"Unknown Comprehend Medical API in routing policy for {section_type}: {api} "
+                    f"(expected one of {', '.join(COMPREHEND_APIS)})"
+                )
+
+    return routing
+
+
+def classify_heading(heading):
+    """Map a heading label to a section type"""
+    for section_type, pattern in HEADING_TYPES:
+        if pattern.search(heading):
+            return section_type
+    return 'other'
+
+
+def split_sections(text):
+    """
+    Split text into contiguous sections covering the whole input.
+    Returns a list of {'type', 'start', 'end'} dicts.
+    """
+    sections = []
+    current = 'other'
+    offset = 0
+
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        line_type = None
+
+        if not stripped and current == 'boilerplate':
+            # A disclaimer covers the rest of its paragraph; the text after it
+            # starts unclassified unless it is another disclaimer paragraph
+            current = 'other'
+
+        if SOURCE_LINE.match(line):
+            # Each document (email body, attachment) starts unclassified
+            current = 'other'
+        elif HEADING_LINE.match(line):
+            current = classify_heading(HEADING_LINE.match(line).group(1))
+        elif DISCLAIMER_LINE.search(line):
+            current = 'boilerplate'
+        elif (SIGN_OFF_LINE.match(line) or SALUTATION_LINE.match(line)
+              or HEADER_LINE.match(line) or FORWARD_LINE.match(line)):
+            # Forwarded chains put a new referral after a sign-off or header,
+            # so text following these lines starts unclassified
+            line_type = 'boilerplate'
+            current = 'other'
+
+        section_type = line_type or current
+        if not stripped and sections:
+            # Blank lines stay with the preceding section
+            section_type = sections[-1]['type']
+
+        if sections and sections[-1]['type'] == section_type:
+            sections[-1]['end'] = offset + len(line)
+        else:
+            sections.append({'type': section_type, 'start': offset, 'end': offset + len(line)})
+
+        offset += len(line)
+
+    return sections
+
+
+def route_sections(text, routing=None):
+    """
+    Build the text each API should receive.
+    Returns {api: [(start, end), ...]} of spans in the original text; APIs
+    with no routed sections are omitted.
+    """
+    routing = {**DEFAULT_ROUTING, **(routing or {})}
+    spans = {}
+
+    for section in split_sections(text):
+        if not text[section['start']:section['end']].strip():
+            continue
+        for api in routing.get(section['type'], routing['other']):
+            spans.setdefault(api, []).append((section['start'], section['end']))
+
+    return spans
+
+
+def join_spans(text, spans):
+    """
+    Concatenate spans into one request text.
+    Returns (request_text, segments) where segments are
+    (request_offset, original_start, length) tuples for mapping offsets back.
+    """
+    parts = []
+    segments = []
+    request_offset = 0
+
+    for start, end in spans:
+        # Merge spans that are adjacent in the original text
+        if segments and segments[-1][1] + segments[-1][2] == start:
+            last = segments[-1]
+            segments[-1] = (last[0], last[1], last[2] + end - start)
+        else:
+            if parts:
+                parts.append('\n')
+                request_offset += 1
+            segments.append((request_offset, start, end - start))
+        parts.append(text[start:end])
+        request_offset += end - start
+
+    return ''.join(parts), segments
+
+
+def to_original_offset(segments, request_offset):
+    """Translate an offset in a joined request text back to the original text"""
+    for seg_offset, original_start, length in reversed(segments):
+        if request_offset >= seg_offset:
+            return original_start + min(request_offset - seg_offset, length)
+    return request_offset
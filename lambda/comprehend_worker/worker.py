@@ -5,13 +5,36 @@ Extracts medical entities using Amazon Comprehend Medical
 import json
 import boto3
 import os
+from sections import (
+    COMPREHEND_APIS,
+    join_spans,
+    route_sections,
+    to_original_offset,
+    validate_routing
+)
+try:
+    from aws_replay import wrap_client
+except ImportError:
+    # aws_replay is only bundled for offline record/replay runs
+    def wrap_client(client):
+        return client
 
 s3_client = boto3.client('s3')
-comprehend_medical = boto3.client('comprehendmedical')
+comprehend_medical = wrap_client(boto3.client('comprehendmedical'))
 lambda_client = boto3.client('lambda')
 
 MAPPER_FUNCTION = os.environ.get('MAPPER_FUNCTION', 'medextract-pipeline-mapper')
 
+# Route text sections only to the APIs likely to yield results ('on'/'off'),
+# with optional JSON overrides of sections.DEFAULT_ROUTING
+SECTION_ROUTING = os.environ.get('SECTION_ROUTING', 'on')
+SECTION_ROUTING_POLICY = validate_routing(
+    json.loads(os.environ.get('SECTION_ROUTING_POLICY', '{}'))
+)
+
+if SECTION_ROUTING not in ('on', 'off'):
+    raise ValueError(f"SECTION_ROUTING must be 'on' or 'off', got {SECTION_ROUTING!r}")
+
 
 def lambda_handler(event, context):
     """
@@ -31,30 +54,17 @@ def lambda_handler(event, context):
             response = s3_client.get_object(Bucket=s3_bucket, Key=text_key)
             text = response['Body'].read().decode('utf-8')
         
-        # Limit text size for Comprehend Medical (20KB limit)
-        text = text[:20000]
-        
-        # Detect medical entities
-        entities_response = comprehend_medical.detect_entities_v2(Text=text)
-        
-        # Infer ICD-10-CM codes
-        icd10_response = comprehend_medical.infer_icd10_cm(Text=text)
-        
-        # Infer SNOMED CT codes
-        snomed_response = comprehend_medical.infer_snomed_ct(Text=text)
-        
-        # Infer RxNorm codes for medications
-        rxnorm_response = comprehend_medical.infer_rx_norm(Text=text)
-        
         # Process and structure results
         results = {
             'messageId': message_id,
-            'entities': process_entities(entities_response),
-            'icd10': process_icd10(icd10_response),
-            'snomed': process_snomed(snomed_response),
-            'medications': process_rxnorm(rxnorm_response)
+            **analyze_text(text)
         }
         
+        print(
+            f"Sent {results['billedCharacters']} characters to Comprehend Medical "
+            f"for message {message_id}"
+        )
+        
         # Store results
         results_key = f"comprehend/{message_id}.json"
         s3_client.put_object(
@@ -71,7 +81,8 @@ def lambda_handler(event, context):
             'messageId': message_id,
             's3Bucket': s3_bucket,
             'resultsKey': results_key,
-            'results': results
+            'results': results,
+            'receivedAt': event.get('receivedAt')
         }
         
         lambda_client.invoke(
@@ -98,6 +109,64 @@ def lambda_handler(event, context):
         raise
 
 
+def analyze_text(text, client=None):
+    """Run Comprehend Medical over text and structure the responses"""
+    client = client or comprehend_medical
+    
+    # Limit text size for Comprehend Medical (20KB limit)
+    text = text[:20000]
+    
+    if SECTION_ROUTING == 'off':
+        requests = {api: (text, None) for api in COMPREHEND_APIS}
+    else:
+        requests = {
+            api: join_spans(text, spans)
+            for api, spans in route_sections(text, SECTION_ROUTING_POLICY).items()
+        }
+    
+    # detect_entities_v2, infer_icd10_cm, infer_snomedct, infer_rx_norm;
+    # APIs with no routed text are skipped
+    responses = {}
+    for api in COMPREHEND_APIS:
+        if api not in requests:
+            responses[api] = {'Entities': []}
+            continue
+        
+        request_text, segments = requests[api]
+        response = getattr(client, api)(Text=request_text)
+        responses[api] = remap_offsets(response, segments) if segments else response
+    
+    return {
+        'entities': process_entities(responses['detect_entities_v2']),
+        'icd10': process_icd10(responses['infer_icd10_cm']),
+        'snomed': process_snomed(responses['infer_snomedct']),
+        'medications': process_rxnorm(responses['infer_rx_norm']),
+        # Characters sent across all APIs, which Comprehend Medical bills by
+        'billedCharacters': sum(len(request_text) for request_text, _ in requests.values())
+    }
+
+
+def remap_offsets(response, segments):
+    """Translate entity offsets in a routed request back to the full text"""
+    def remap(item):
+        if 'BeginOffset' not in item:
+            return item
+        return {
+            **item,
+            'BeginOffset': to_original_offset(segments, item['BeginOffset']),
+            'EndOffset': to_original_offset(segments, item['EndOffset'] - 1) + 1
+        }
+    
+    entities = []
+    for entity in response.get('Entities', []):
+        entity = remap(entity)
+        if 'Attributes' in entity:
+            entity['Attributes'] = [remap(attr) for attr in entity['Attributes']]
+        entities.append(entity)
+    
+    return {**response, 'Entities': entities}
+
+
 def process_entities(response):
     """Process detected entities"""
     entities = []
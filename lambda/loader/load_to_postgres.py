@@ -5,6 +5,7 @@ Loads structured medical data into Aurora PostgreSQL
 import json
 import boto3
 import os
+import random
 import psycopg2
 from datetime import datetime
 
@@ -16,6 +17,13 @@ DB_NAME = os.environ.get('DB_NAME', 'medextract')
 DB_USER = os.environ.get('DB_USER', 'medextract_admin')
 DB_SECRET_NAME = os.environ.get('DB_SECRET_NAME')
 
+# Referral statuses with a dedicated counter column in processing_stats_daily
+STATS_STATUS_COLUMNS = ('completed', 'failed', 'pending')
+
+# Each day's counters are spread over this many rows so concurrent loaders
+# do not all wait on one row lock; the processing_stats view sums them
+PROCESSING_STATS_SHARDS = int(os.environ.get('PROCESSING_STATS_SHARDS', '8'))
+
 
 def lambda_handler(event, context):
     """
@@ -26,19 +34,10 @@ def lambda_handler(event, context):
     try:
         message_id = event['messageId']
         data = event['data']
-        
-        # Get database credentials
-        db_password = get_db_password()
+        received_at = event.get('receivedAt')
         
         # Connect to database
-        conn = psycopg2.connect(
-            host=DB_ENDPOINT.split(':')[0],
-            port=5432,
-            database=DB_NAME,
-            user=DB_USER,
-            password=db_password,
-            sslmode='require'
-        )
+        conn = get_connection()
         
         cursor = conn.cursor()
         
@@ -57,6 +56,19 @@ def lambda_handler(event, context):
         for procedure in data.get('procedures', []):
             insert_procedure(cursor, patient_id, procedure)
         
+        # Update materialized summaries in the same transaction
+        received_date = update_referral_status(
+            cursor, message_id, 'completed', patient_id, received_at
+        )
+        update_patient_summary(
+            cursor,
+            patient_id,
+            len(data.get('diagnoses', [])),
+            len(data.get('medications', [])),
+            len(data.get('procedures', [])),
+            received_date
+        )
+        
         # Commit transaction
         conn.commit()
         
@@ -78,10 +90,29 @@ def lambda_handler(event, context):
         print(f"Error loading data: {str(e)}")
         if 'conn' in locals():
             conn.rollback()
+            try:
+                cursor = conn.cursor()
+                update_referral_status(cursor, message_id, 'failed', received_at=received_at)
+                conn.commit()
+            except Exception as status_error:
+                print(f"Error recording failed referral: {str(status_error)}")
+                conn.rollback()
             conn.close()
         raise
 
 
+def get_connection():
+    """Open a connection to the Aurora PostgreSQL cluster"""
+    return psycopg2.connect(
+        host=DB_ENDPOINT.split(':')[0],
+        port=5432,
+        database=DB_NAME,
+        user=DB_USER,
+        password=get_db_password(),
+        sslmode='require'
+    )
+
+
 def get_db_password():
     """Retrieve database password from environment or Secrets Manager"""
     if DB_SECRET_NAME:
@@ -166,3 +197,130 @@ def insert_procedure(cursor, patient_id, procedure):
         procedure.get('snomed_code'),
         procedure.get('confidence', 0.0)
     ))
+
+
+def update_referral_status(cursor, message_id, status, patient_id=None, received_at=None):
+    """
+    Move a referral to a new status and adjust the daily processing counters.
+    received_at is the ISO timestamp the email arrived (now if not given).
+    Returns the referral's received_date.
+    """
+    # Create the referral as pending if it was never recorded. The loader is
+    # the first stage to write referrals, so pending only counts referrals
+    # whose load is in progress.
+    cursor.execute("""
+        INSERT INTO referrals
+        (message_id, patient_id, status, received_date, created_at, updated_at)
+        VALUES (%s, %s, 'pending', COALESCE(%s::timestamptz, NOW()), NOW(), NOW())
+        ON CONFLICT (message_id) DO NOTHING
+        RETURNING DATE(created_at)
+    """, (message_id, patient_id, received_at))
+    
+    # Collect every counter change so one stats row is updated per transaction
+    deltas = {}
+    if cursor.fetchone():
+        deltas = {'total_referrals': 1, 'pending': 1}
+    
+    cursor.execute("""
+        SELECT id, status, DATE(created_at), received_date, processed_date
+        FROM referrals
+        WHERE message_id = %s
+        FOR UPDATE
+    """, (message_id,))
+    
+    referral_id, old_status, stats_date, received_date, old_processed = cursor.fetchone()
+    
+    cursor.execute("""
+        UPDATE referrals
+        SET status = %s,
+            patient_id = COALESCE(%s, patient_id),
+            processed_date = NOW()
+        WHERE id = %s
+        RETURNING processed_date
+    """, (status, patient_id, referral_id))
+    
+    new_processed = cursor.fetchone()[0]
+    
+    if old_status in STATS_STATUS_COLUMNS:
+        deltas[old_status] = deltas.get(old_status, 0) - 1
+    if status in STATS_STATUS_COLUMNS:
+        deltas[status] = deltas.get(status, 0) + 1
+    
+    # Replace any earlier processing time contribution with the new one
+    if received_date:
+        if old_processed:
+            deltas['processing_time_sum_seconds'] = -(old_processed - received_date).total_seconds()
+            deltas['processing_time_count'] = -1
+        deltas['processing_time_sum_seconds'] = (
+            deltas.get('processing_time_sum_seconds', 0)
+            + (new_processed - received_date).total_seconds()
+        )
+        deltas['processing_time_count'] = deltas.get('processing_time_count', 0) + 1
+    
+    update_processing_stats(cursor, stats_date, deltas)
+    
+    return received_date
+
+
+def update_processing_stats(cursor, stats_date, deltas):
+    """Apply counter deltas to a random shard of one day's processing statistics"""
+    columns = {
+        'total_referrals': 0,
+        'completed': 0,
+        'failed': 0,
+        'pending': 0,
+        'processing_time_sum_seconds': 0.0,
+        'processing_time_count': 0
+    }
+    columns.update(deltas)
+    
+    if not any(columns.values()):
+        return
+    
+    cursor.execute("""
+        INSERT INTO processing_stats_daily
+        (date, shard, total_referrals, completed, failed, pending,
+         processing_time_sum_seconds, processing_time_count, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (date, shard)
+        DO UPDATE SET
+            total_referrals = processing_stats_daily.total_referrals + EXCLUDED.total_referrals,
+            completed = processing_stats_daily.completed + EXCLUDED.completed,
+            failed = processing_stats_daily.failed + EXCLUDED.failed,
+            pending = processing_stats_daily.pending + EXCLUDED.pending,
+            processing_time_sum_seconds = processing_stats_daily.processing_time_sum_seconds
+                + EXCLUDED.processing_time_sum_seconds,
+            processing_time_count = processing_stats_daily.processing_time_count
+                + EXCLUDED.processing_time_count,
+            updated_at = NOW()
+    """, (
+        stats_date,
+        random.randrange(PROCESSING_STATS_SHARDS),
+        columns['total_referrals'],
+        columns['completed'],
+        columns['failed'],
+        columns['pending'],
+        columns['processing_time_sum_seconds'],
+        columns['processing_time_count']
+    ))
+
+
+def update_patient_summary(cursor, patient_id, diagnosis_count, medication_count,
+                           procedure_count, referral_date=None):
+    """Increment the materialized per-patient entity counters"""
+    cursor.execute("""
+        INSERT INTO patient_summary_counts
+        (patient_id, diagnosis_count, medication_count, procedure_count,
+         last_referral_date, updated_at)
+        VALUES (%s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (patient_id)
+        DO UPDATE SET
+            diagnosis_count = patient_summary_counts.diagnosis_count + EXCLUDED.diagnosis_count,
+            medication_count = patient_summary_counts.medication_count + EXCLUDED.medication_count,
+            procedure_count = patient_summary_counts.procedure_count + EXCLUDED.procedure_count,
+            last_referral_date = GREATEST(
+                patient_summary_counts.last_referral_date,
+                EXCLUDED.last_referral_date
+            ),
+            updated_at = NOW()
+    """, (patient_id, diagnosis_count, medication_count, procedure_count, referral_date))
@@ -0,0 +1,77 @@
+"""
+Partition Maintenance
+Creates monthly partitions of the diagnoses, medications and procedures
+tables ahead of time and drops partitions past the retention period
+
+Usage:
+    python partition_maintenance.py
+"""
+import json
+import os
+from datetime import date
+from load_to_postgres import get_connection
+
+PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', '3'))
+# 0 keeps every partition
+PARTITION_RETENTION_MONTHS = int(os.environ.get('PARTITION_RETENTION_MONTHS', '0'))
+# Longest wait for the parent table locks; loads queue behind the request
+PARTITION_LOCK_TIMEOUT = os.environ.get('PARTITION_LOCK_TIMEOUT', '5s')
+
+
+def lambda_handler(event, context):
+    """
+    Run scheduled partition maintenance
+    """
+    print(f"Received event: {json.dumps(event)}")
+
+    result = maintain_partitions(
+        event.get('monthsAhead', PARTITION_MONTHS_AHEAD),
+        event.get('retentionMonths', PARTITION_RETENTION_MONTHS)
+    )
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps(result)
+    }
+
+
+def maintain_partitions(months_ahead, retention_months):
+    """Create upcoming partitions and drop expired ones in one transaction"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+
+        today = date.today()
+        cursor.execute(
+            "SELECT create_entity_partitions(%s, (%s + make_interval(months => %s))::date)",
+            (today, today, months_ahead)
+        )
+        created = cursor.fetchone()[0]
+
+        dropped = 0
+        if retention_months > 0:
+            # On timeout the run fails and the next scheduled run retries
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", (PARTITION_LOCK_TIMEOUT,))
+            cursor.execute("SELECT drop_expired_entity_partitions(%s)", (retention_months,))
+            dropped = cursor.fetchone()[0]
+
+        conn.commit()
+
+        print(f"Partition maintenance: created {created}, dropped {dropped}")
+
+        return {
+            'message': 'Partition maintenance completed',
+            'created': created,
+            'dropped': dropped
+        }
+    except Exception as e:
+        print(f"Error maintaining partitions: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    result = maintain_partitions(PARTITION_MONTHS_AHEAD, PARTITION_RETENTION_MONTHS)
+    print(json.dumps(result, indent=2))
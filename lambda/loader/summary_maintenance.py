@@ -0,0 +1,155 @@
+"""
+Summary Maintenance
+Rebuilds and verifies the materialized patient summary and processing
+statistics tables maintained incrementally by the loader
+
+Usage:
+    python summary_maintenance.py check
+    python summary_maintenance.py rebuild
+"""
+import json
+import sys
+from load_to_postgres import get_connection
+
+# Rows whose stored counters differ from a full recomputation
+PATIENT_SUMMARY_DRIFT_SQL = """
+    SELECT
+        COALESCE(s.patient_id, l.patient_id),
+        s.diagnosis_count, l.diagnosis_count,
+        s.medication_count, l.medication_count,
+        s.procedure_count, l.procedure_count
+    FROM patient_summary_counts s
+    FULL OUTER JOIN patient_summary_live l ON s.patient_id = l.patient_id
+    WHERE COALESCE(s.diagnosis_count, 0) <> l.diagnosis_count
+       OR COALESCE(s.medication_count, 0) <> l.medication_count
+       OR COALESCE(s.procedure_count, 0) <> l.procedure_count
+       OR s.last_referral_date IS DISTINCT FROM l.last_referral_date
+       OR l.patient_id IS NULL
+"""
+
+PROCESSING_STATS_DRIFT_SQL = """
+    SELECT
+        COALESCE(s.date, l.date),
+        s.total_referrals, l.total_referrals,
+        s.completed, l.completed,
+        s.failed, l.failed,
+        s.pending, l.pending
+    FROM (
+        SELECT
+            date,
+            SUM(total_referrals) as total_referrals,
+            SUM(completed) as completed,
+            SUM(failed) as failed,
+            SUM(pending) as pending,
+            SUM(processing_time_sum_seconds) as processing_time_sum_seconds,
+            SUM(processing_time_count) as processing_time_count
+        FROM processing_stats_daily
+        GROUP BY date
+    ) s
+    FULL OUTER JOIN processing_stats_live l ON s.date = l.date
+    WHERE COALESCE(s.total_referrals, 0) <> COALESCE(l.total_referrals, 0)
+       OR COALESCE(s.completed, 0) <> COALESCE(l.completed, 0)
+       OR COALESCE(s.failed, 0) <> COALESCE(l.failed, 0)
+       OR COALESCE(s.pending, 0) <> COALESCE(l.pending, 0)
+       OR COALESCE(s.processing_time_count, 0) <> COALESCE(l.processing_time_count, 0)
+       OR ABS(COALESCE(s.processing_time_sum_seconds, 0)
+              - COALESCE(l.processing_time_sum_seconds, 0)) > 0.001
+"""
+
+
+def lambda_handler(event, context):
+    """
+    Run a summary maintenance action ('check' or 'rebuild')
+    """
+    print(f"Received event: {json.dumps(event)}")
+
+    action = event.get('action', 'check')
+    if action == 'rebuild':
+        result = rebuild()
+    elif action == 'check':
+        result = check()
+    else:
+        raise ValueError(f"Unknown action: {action}")
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps(result)
+    }
+
+
+def rebuild():
+    """Recompute both summary tables from the base tables"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT rebuild_summary_tables()")
+        conn.commit()
+
+        print("Rebuilt summary tables")
+
+        return {'message': 'Summary tables rebuilt'}
+    except Exception as e:
+        print(f"Error rebuilding summary tables: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def check():
+    """Compare summary tables against a full recomputation"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+
+        cursor.execute(PATIENT_SUMMARY_DRIFT_SQL)
+        patient_drift = [
+            {
+                'patientId': row[0],
+                'diagnosisCount': [row[1], row[2]],
+                'medicationCount': [row[3], row[4]],
+                'procedureCount': [row[5], row[6]]
+            }
+            for row in cursor.fetchall()
+        ]
+
+        cursor.execute(PROCESSING_STATS_DRIFT_SQL)
+        stats_drift = [
+            {
+                'date': row[0].isoformat(),
+                'totalReferrals': [row[1], row[2]],
+                'completed': [row[3], row[4]],
+                'failed': [row[5], row[6]],
+                'pending': [row[7], row[8]]
+            }
+            for row in cursor.fetchall()
+        ]
+
+        conn.rollback()
+
+        consistent = not patient_drift and not stats_drift
+        print(
+            f"Consistency check: {len(patient_drift)} patient rows and "
+            f"{len(stats_drift)} stats rows differ"
+        )
+
+        # Pairs are [stored, expected]
+        return {
+            'consistent': consistent,
+            'patientSummaryDrift': patient_drift,
+            'processingStatsDrift': stats_drift
+        }
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    action = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    if action == 'rebuild':
+        print(json.dumps(rebuild(), indent=2))
+    elif action == 'check':
+        result = check()
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result['consistent'] else 1)
+    else:
+        sys.exit(f"Unknown action: {action}")
@@ -13,6 +13,7 @@ lambda_client = boto3.client('lambda')
 
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'medextract-pipeline-ontology-dev')
 LOADER_FUNCTION = os.environ.get('LOADER_FUNCTION', 'medextract-pipeline-loader')
+EXPORTER_FUNCTION = os.environ.get('EXPORTER_FUNCTION')
 
 
 def lambda_handler(event, context):
@@ -29,33 +30,11 @@ def lambda_handler(event, context):
         table = dynamodb.Table(DYNAMODB_TABLE)
         
         # Enhance entities with additional mappings
-        mapped_entities = []
-        
-        for entity in results.get('entities', []):
-            # Try to find mapping in DynamoDB
-            mapping = lookup_mapping(table, entity['text'], entity['category'])
-            
-            mapped_entity = {
-                **entity,
-                'mapped': mapping is not None
-            }
-            
-            if mapping:
-                mapped_entity.update({
-                    'icd10_code': mapping.get('icd10_code'),
-                    'snomed_code': mapping.get('snomed_code'),
-                    'preferred_term': mapping.get('preferred_term')
-                })
-            
-            mapped_entities.append(mapped_entity)
+        mapped_entities = map_entities(table, results.get('entities', []))
         
         # Create structured output
         structured_data = {
-            'messageId': message_id,
-            'patient': extract_patient_info(mapped_entities),
-            'diagnoses': extract_diagnoses(results, mapped_entities),
-            'medications': extract_medications(results),
-            'procedures': extract_procedures(mapped_entities),
+            **build_structured_data(message_id, results, mapped_entities),
             'timestamp': context.aws_request_id
         }
         
@@ -75,7 +54,8 @@ def lambda_handler(event, context):
             'messageId': message_id,
             's3Bucket': s3_bucket,
             'structuredKey': structured_key,
-            'data': structured_data
+            'data': structured_data,
+            'receivedAt': event.get('receivedAt')
         }
         
         lambda_client.invoke(
@@ -86,6 +66,16 @@ def lambda_handler(event, context):
         
         print(f"Invoked Postgres loader for message {message_id}")
         
+        # Invoke analytics exporter alongside the loader
+        if EXPORTER_FUNCTION:
+            lambda_client.invoke(
+                FunctionName=EXPORTER_FUNCTION,
+                InvocationType='Event',
+                Payload=json.dumps(loader_payload, default=decimal_default)
+            )
+            
+            print(f"Invoked analytics exporter for message {message_id}")
+        
         return {
             'statusCode': 200,
             'body': json.dumps({
@@ -100,6 +90,42 @@ def lambda_handler(event, context):
         raise
 
 
+def map_entities(table, entities):
+    """Attach ontology codes to entities found in the mapping table"""
+    mapped_entities = []
+    
+    for entity in entities:
+        # Try to find mapping in DynamoDB
+        mapping = lookup_mapping(table, entity['text'], entity['category'])
+        
+        mapped_entity = {
+            **entity,
+            'mapped': mapping is not None
+        }
+        
+        if mapping:
+            mapped_entity.update({
+                'icd10_code': mapping.get('icd10_code'),
+                'snomed_code': mapping.get('snomed_code'),
+                'preferred_term': mapping.get('preferred_term')
+            })
+        
+        mapped_entities.append(mapped_entity)
+    
+    return mapped_entities
+
+
+def build_structured_data(message_id, results, mapped_entities):
+    """Create the structured referral record from Comprehend results"""
+    return {
+        'messageId': message_id,
+        'patient': extract_patient_info(mapped_entities),
+        'diagnoses': extract_diagnoses(results, mapped_entities),
+        'medications': extract_medications(results),
+        'procedures': extract_procedures(mapped_entities)
+    }
+
+
 def lookup_mapping(table, entity_text, entity_type):
     """Look up entity in DynamoDB ontology table"""
     try:
@@ -0,0 +1,306 @@
+"""
+AWS Record/Replay
+Wraps boto3 clients to record service responses to a local store, or to
+replay them with simulated latency and throttling for offline load tests
+
+Configured through environment variables:
+    AWS_REPLAY_MODE        off (default), record or replay
+    AWS_REPLAY_STORE       SQLite file holding recordings (default aws_recordings.db)
+    AWS_REPLAY_LATENCY     recorded (default), none, fixed:MS, uniform:LO_MS:HI_MS
+                           or lognormal:MEDIAN_MS:SIGMA
+    AWS_REPLAY_RATE_LIMIT  requests per second per operation before replay
+                           throttles (default 0, unlimited)
+    AWS_REPLAY_BURST       token bucket size (default: the rate limit)
+    AWS_REPLAY_SEED        seed for the latency distribution and retry jitter
+
+Throttled replays are retried the way the wrapped client would retry them:
+attempts come from its retry configuration (retries in botocore Config,
+AWS_RETRY_MODE, AWS_MAX_ATTEMPTS) and backoff sleeps with full jitter, so it
+counts towards the caller's latency. ThrottlingException is raised once the
+attempts are used up. Adaptive mode's client-side rate limiting is not modelled.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from botocore.exceptions import ClientError
+
+REPLAY_MODE = os.environ.get('AWS_REPLAY_MODE', 'off')
+REPLAY_STORE = os.environ.get('AWS_REPLAY_STORE', 'aws_recordings.db')
+REPLAY_LATENCY = os.environ.get('AWS_REPLAY_LATENCY', 'recorded')
+REPLAY_RATE_LIMIT = float(os.environ.get('AWS_REPLAY_RATE_LIMIT', '0'))
+REPLAY_BURST = float(os.environ.get('AWS_REPLAY_BURST', '0')) or REPLAY_RATE_LIMIT
+REPLAY_SEED = os.environ.get('AWS_REPLAY_SEED')
+
+# botocore defaults: total attempts per retry mode and the backoff cap
+DEFAULT_MAX_ATTEMPTS = {'legacy': 5, 'standard': 3, 'adaptive': 3}
+MAX_BACKOFF_SECONDS = 20
+
+
+class ReplayMissError(Exception):
+    """Raised when replay mode has no recording for a request"""
+
+
+def wrap_client(client, mode=None, store=None):
+    """Return the client wrapped for the configured mode, or unchanged when off"""
+    mode = mode or REPLAY_MODE
+    if mode == 'off':
+        return client
+    if mode not in ('record', 'replay'):
+        raise ValueError(f"Unknown AWS_REPLAY_MODE: {mode}")
+
+    return ReplayClient(client, mode, store or get_store(REPLAY_STORE))
+
+
+def request_key(service, operation, params):
+    """Hash a request into the key its response is stored under"""
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+    digest = hashlib.sha256(f"{service}:{operation}:{canonical}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path):
+    """Return the shared store for a path"""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = RecordingStore(path)
+        return _stores[path]
+
+
+class RecordingStore:
+    """SQLite store of zlib-compressed JSON responses keyed by request hash"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS recordings (
+                request_key TEXT PRIMARY KEY,
+                service TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                latency_ms REAL NOT NULL,
+                response BLOB NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.cache = None
+
+    def put(self, key, service, operation, latency_ms, response):
+        """Store one response, replacing any earlier recording"""
+        blob = zlib.compress(json.dumps(response, default=str).encode('utf-8'))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO recordings VALUES (?, ?, ?, ?, ?)",
+                (key, service, operation, latency_ms, blob)
+            )
+            self.conn.commit()
+            if self.cache is not None:
+                self.cache[key] = (latency_ms, blob)
+
+    def get(self, key):
+        """Return (latency_ms, response) for a key, or None"""
+        with self.lock:
+            # Replay serves from memory so lookups stay off the disk
+            if self.cache is None:
+                rows = self.conn.execute(
+                    "SELECT request_key, latency_ms, response FROM recordings"
+                )
+                self.cache = {row[0]: (row[1], row[2]) for row in rows}
+            entry = self.cache.get(key)
+
+        if entry is None:
+            return None
+
+        latency_ms, blob = entry
+        # Decode per call so callers never share a mutable response
+        return latency_ms, json.loads(zlib.decompress(blob))
+
+
+class LatencyModel:
+    """Delay to apply to a replayed response"""
+
+    def __init__(self, spec, seed=None):
+        self.kind, *args = spec.split(':')
+        self.args = [float(a) for a in args]
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        if self.kind not in ('recorded', 'none', 'fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown AWS_REPLAY_LATENCY: {spec}")
+
+    def sample_ms(self, recorded_ms):
+        if self.kind == 'recorded':
+            return recorded_ms
+        if self.kind == 'none':
+            return 0.0
+        if self.kind == 'fixed':
+            return self.args[0]
+
+        with self.lock:
+            if self.kind == 'uniform':
+                return self.random.uniform(self.args[0], self.args[1])
+            return self.random.lognormvariate(math.log(self.args[0]), self.args[1])
+
+
+class TokenBucket:
+    """Per-operation request rate limiter"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token; returns False when the caller should be throttled"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def retry_policy(client):
+    """Total attempts the client makes for a retryable error"""
+    retries = client.meta.config.retries or {}
+    if 'total_max_attempts' in retries:
+        return retries['total_max_attempts']
+    if 'max_attempts' in retries:
+        return retries['max_attempts'] + 1
+    if 'AWS_MAX_ATTEMPTS' in os.environ:
+        return int(os.environ['AWS_MAX_ATTEMPTS'])
+
+    mode = retries.get('mode') or os.environ.get('AWS_RETRY_MODE', 'legacy')
+    return DEFAULT_MAX_ATTEMPTS.get(mode, DEFAULT_MAX_ATTEMPTS['standard'])
+
+
+_latency_model = None
+_buckets = {}
+_buckets_lock = threading.Lock()
+_retry_random = random.Random(REPLAY_SEED)
+_retry_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_latency_model():
+    global _latency_model
+    if _latency_model is None:
+        _latency_model = LatencyModel(REPLAY_LATENCY, REPLAY_SEED)
+    return _latency_model
+
+
+def get_bucket(service, operation):
+    with _buckets_lock:
+        key = (service, operation)
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(REPLAY_RATE_LIMIT, REPLAY_BURST)
+        return _buckets[key]
+
+
+def backoff_seconds(attempt):
+    """Exponential backoff with full jitter before retrying after attempt"""
+    with _retry_lock:
+        jitter = _retry_random.random()
+    return min(jitter * 2 ** (attempt - 1), MAX_BACKOFF_SECONDS)
+
+
+def count(service, operation, **counters):
+    """Add to the replay counters of one operation"""
+    with _stats_lock:
+        stats = _stats.setdefault(
+            f"{service}.{operation}",
+            {'calls': 0, 'retries': 0, 'throttled': 0, 'missing': 0}
+        )
+        for name, n in counters.items():
+            stats[name] += n
+
+
+def replay_stats():
+    """Per-operation replay counters: calls, retries, throttled, missing"""
+    with _stats_lock:
+        return {operation: dict(stats) for operation, stats in _stats.items()}
+
+
+class ReplayClient:
+    """Proxy around a boto3 client that records or replays its operations"""
+
+    def __init__(self, client, mode, store):
+        self._client = client
+        self._mode = mode
+        self._store = store
+        self._service = client.meta.service_model.service_name
+        self._operations = client.meta.method_to_api_mapping
+        self._max_attempts = retry_policy(client)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in self._operations:
+            return attr
+
+        operation = self._operations[name]
+        if self._mode == 'record':
+            return lambda **params: self._record(attr, operation, params)
+        return lambda **params: self._replay(operation, params)
+
+    def _record(self, method, operation, params):
+        start = time.perf_counter()
+        response = method(**params)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        key = request_key(self._service, operation, params)
+        self._store.put(key, self._service, operation, latency_ms, response)
+
+        return response
+
+    def _replay(self, operation, params):
+        count(self._service, operation, calls=1)
+
+        attempt = 1
+        while REPLAY_RATE_LIMIT and not get_bucket(self._service, operation).acquire():
+            if attempt >= self._max_attempts:
+                count(self._service, operation, throttled=1)
+                raise ClientError(
+                    {
+                        'Error': {
+                            'Code': 'ThrottlingException',
+                            'Message': 'Rate exceeded (replay)'
+                        },
+                        'ResponseMetadata': {
+                            'HTTPStatusCode': 400,
+                            'RetryAttempts': attempt - 1
+                        }
+                    },
+                    operation
+                )
+            time.sleep(backoff_seconds(attempt))
+            count(self._service, operation, retries=1)
+            attempt += 1
+
+        key = request_key(self._service, operation, params)
+        entry = self._store.get(key)
+        if entry is None:
+            count(self._service, operation, missing=1)
+            raise ReplayMissError(f"No recording for {self._service}.{operation} ({key[:12]})")
+
+        recorded_ms, response = entry
+        delay_ms = get_latency_model().sample_ms(recorded_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+        return response
@@ -0,0 +1,137 @@
+-- MedExtract Pipeline: partition maintenance functions for the entity tables
+-- Included by schema.sql and partition_migration.sql; safe to re-run.
+
+-- Create monthly partitions of the entity tables covering from_month..to_month.
+-- Rows already caught by a DEFAULT partition are moved into the new partition.
+CREATE OR REPLACE FUNCTION create_entity_partitions(from_month DATE, to_month DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    parent TEXT;
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+    has_default_rows BOOLEAN;
+    created INTEGER := 0;
+BEGIN
+    FOREACH parent IN ARRAY ARRAY['diagnoses', 'medications', 'procedures'] LOOP
+        month_start := date_trunc('month', from_month)::date;
+
+        WHILE month_start <= to_month LOOP
+            month_end := (month_start + INTERVAL '1 month')::date;
+            partition_name := parent || '_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM');
+
+            IF to_regclass(partition_name) IS NULL THEN
+                EXECUTE format(
+                    'SELECT EXISTS (SELECT 1 FROM %I WHERE created_at >= %L AND created_at < %L)',
+                    parent || '_default', month_start, month_end
+                ) INTO has_default_rows;
+
+                IF has_default_rows THEN
+                    EXECUTE format(
+                        'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                        partition_name, parent
+                    );
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                        'INSERT INTO %I SELECT * FROM moved',
+                        parent || '_default', month_start, month_end, partition_name
+                    );
+                    EXECUTE format(
+                        'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                        parent, partition_name, month_start, month_end
+                    );
+                ELSE
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                        partition_name, parent, month_start, month_end
+                    );
+                END IF;
+
+                created := created + 1;
+            END IF;
+
+            month_start := month_end;
+        END LOOP;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Monthly entity partitions wholly before cutoff
+CREATE OR REPLACE FUNCTION expired_entity_partitions(cutoff DATE)
+RETURNS TABLE (parent_name TEXT, partition_name TEXT) AS $$
+    SELECT parent_name, partition_name
+    FROM (
+        SELECT parent.relname::text as parent_name, child.relname::text as partition_name,
+               to_date(substring(child.relname from '_y([0-9]{4}m[0-9]{2})$'), 'YYYY"m"MM') as month_start
+        FROM pg_inherits
+        JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+        JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+        WHERE parent.relname IN ('diagnoses', 'medications', 'procedures')
+          AND child.relname ~ '_y[0-9]{4}m[0-9]{2}$'
+    ) partitions
+    WHERE (month_start + INTERVAL '1 month')::date <= cutoff
+    ORDER BY month_start, parent_name;
+$$ LANGUAGE sql STABLE;
+
+-- Drop monthly entity partitions older than retention_months, and delete rows
+-- older than the cutoff from the DEFAULT partitions, first subtracting the
+-- removed rows from patient_summary_counts. Returns the partitions dropped.
+-- Loaders wait on the parent tables while partitions are dropped; callers
+-- should set lock_timeout so a long-running load fails this run instead.
+CREATE OR REPLACE FUNCTION drop_expired_entity_partitions(retention_months INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => retention_months))::date;
+    part RECORD;
+    parent TEXT;
+    count_column TEXT;
+    dropped INTEGER := 0;
+BEGIN
+    -- DROP TABLE needs ACCESS EXCLUSIVE on the parent. Take it before any
+    -- counter row is locked, in the order the loader inserts, since loaders
+    -- hold their entity table locks while updating patient_summary_counts.
+    PERFORM 1 FROM expired_entity_partitions(cutoff);
+    IF FOUND THEN
+        LOCK TABLE diagnoses, medications, procedures IN ACCESS EXCLUSIVE MODE;
+    END IF;
+
+    FOR part IN SELECT * FROM expired_entity_partitions(cutoff) LOOP
+        count_column := CASE part.parent_name
+            WHEN 'diagnoses' THEN 'diagnosis_count'
+            WHEN 'medications' THEN 'medication_count'
+            ELSE 'procedure_count'
+        END;
+
+        EXECUTE format(
+            'UPDATE patient_summary_counts s SET %I = s.%I - x.n, updated_at = NOW() '
+            'FROM (SELECT patient_id, COUNT(*) as n FROM %I GROUP BY patient_id) x '
+            'WHERE s.patient_id = x.patient_id',
+            count_column, count_column, part.partition_name
+        );
+        EXECUTE format('DROP TABLE %I', part.partition_name);
+
+        dropped := dropped + 1;
+    END LOOP;
+
+    -- Rows outside the prepared months land in the DEFAULT partitions
+    FOREACH parent IN ARRAY ARRAY['diagnoses', 'medications', 'procedures'] LOOP
+        count_column := CASE parent
+            WHEN 'diagnoses' THEN 'diagnosis_count'
+            WHEN 'medications' THEN 'medication_count'
+            ELSE 'procedure_count'
+        END;
+
+        EXECUTE format(
+            'WITH expired AS (DELETE FROM %I WHERE created_at < %L RETURNING patient_id) '
+            'UPDATE patient_summary_counts s SET %I = s.%I - x.n, updated_at = NOW() '
+            'FROM (SELECT patient_id, COUNT(*) as n FROM expired GROUP BY patient_id) x '
+            'WHERE s.patient_id = x.patient_id',
+            parent || '_default', cutoff, count_column, count_column
+        );
+    END LOOP;
+
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,177 @@
+-- MedExtract Pipeline: partition the entity tables
+-- Converts existing unpartitioned diagnoses, medications and procedures
+-- tables to the monthly range-partitioned layout in sql/schema.sql.
+-- New deployments get this layout from schema.sql and do not need it.
+--
+-- Also installs the partition functions and the summary tables and views,
+-- and rebuilds the summaries. Run with psql -f from any directory (the
+-- includes resolve relative to this file) in a maintenance window; each
+-- table is locked while its rows are copied.
+
+\c medextract;
+
+BEGIN;
+
+-- Views over the entity tables would otherwise follow the renamed tables;
+-- all four are recreated from summary_tables.sql below
+DROP VIEW IF EXISTS patient_summary, patient_summary_live, processing_stats, processing_stats_live;
+
+\ir partition_functions.sql
+
+-- Diagnoses
+ALTER TABLE diagnoses RENAME TO diagnoses_unpartitioned;
+ALTER TABLE diagnoses_unpartitioned RENAME CONSTRAINT diagnoses_pkey TO diagnoses_unpartitioned_pkey;
+ALTER TABLE diagnoses_unpartitioned RENAME CONSTRAINT diagnoses_patient_id_fkey TO diagnoses_unpartitioned_patient_id_fkey;
+DROP TRIGGER IF EXISTS update_diagnoses_updated_at ON diagnoses_unpartitioned;
+DROP INDEX IF EXISTS idx_diagnoses_patient_id;
+DROP INDEX IF EXISTS idx_diagnoses_icd10;
+DROP INDEX IF EXISTS idx_diagnoses_snomed;
+
+CREATE TABLE diagnoses (
+    id INTEGER NOT NULL DEFAULT nextval('diagnoses_id_seq'),
+    patient_id INTEGER NOT NULL REFERENCES patients(id) ON DELETE CASCADE,
+    diagnosis_text TEXT NOT NULL,
+    icd10_code VARCHAR(10),
+    snomed_code VARCHAR(20),
+    confidence FLOAT,
+    diagnosis_date DATE,
+    status VARCHAR(50) DEFAULT 'active',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE diagnoses_default PARTITION OF diagnoses DEFAULT;
+
+CREATE INDEX idx_diagnoses_patient_created ON diagnoses(patient_id, created_at)
+    INCLUDE (icd10_code, snomed_code);
+CREATE INDEX idx_diagnoses_icd10_created ON diagnoses(icd10_code, created_at)
+    INCLUDE (patient_id);
+CREATE INDEX idx_diagnoses_snomed ON diagnoses(snomed_code);
+
+-- Keep ids from the existing sequence; it must change owner before the old table is dropped
+ALTER SEQUENCE diagnoses_id_seq OWNED BY diagnoses.id;
+
+CREATE TRIGGER update_diagnoses_updated_at BEFORE UPDATE ON diagnoses
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+COMMENT ON TABLE diagnoses IS 'Patient diagnoses extracted from referral documents';
+
+-- Medications
+ALTER TABLE medications RENAME TO medications_unpartitioned;
+ALTER TABLE medications_unpartitioned RENAME CONSTRAINT medications_pkey TO medications_unpartitioned_pkey;
+ALTER TABLE medications_unpartitioned RENAME CONSTRAINT medications_patient_id_fkey TO medications_unpartitioned_patient_id_fkey;
+DROP TRIGGER IF EXISTS update_medications_updated_at ON medications_unpartitioned;
+DROP INDEX IF EXISTS idx_medications_patient_id;
+DROP INDEX IF EXISTS idx_medications_rxnorm;
+
+CREATE TABLE medications (
+    id INTEGER NOT NULL DEFAULT nextval('medications_id_seq'),
+    patient_id INTEGER NOT NULL REFERENCES patients(id) ON DELETE CASCADE,
+    medication_name VARCHAR(255) NOT NULL,
+    rxnorm_code VARCHAR(20),
+    dosage VARCHAR(100),
+    frequency VARCHAR(100),
+    route VARCHAR(50),
+    start_date DATE,
+    end_date DATE,
+    confidence FLOAT,
+    status VARCHAR(50) DEFAULT 'active',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE medications_default PARTITION OF medications DEFAULT;
+
+CREATE INDEX idx_medications_patient_created ON medications(patient_id, created_at)
+    INCLUDE (rxnorm_code);
+CREATE INDEX idx_medications_rxnorm_created ON medications(rxnorm_code, created_at)
+    INCLUDE (patient_id);
+
+-- Keep ids from the existing sequence; it must change owner before the old table is dropped
+ALTER SEQUENCE medications_id_seq OWNED BY medications.id;
+
+CREATE TRIGGER update_medications_updated_at BEFORE UPDATE ON medications
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+COMMENT ON TABLE medications IS 'Patient medications and prescriptions';
+
+-- Procedures
+ALTER TABLE procedures RENAME TO procedures_unpartitioned;
+ALTER TABLE procedures_unpartitioned RENAME CONSTRAINT procedures_pkey TO procedures_unpartitioned_pkey;
+ALTER TABLE procedures_unpartitioned RENAME CONSTRAINT procedures_patient_id_fkey TO procedures_unpartitioned_patient_id_fkey;
+DROP TRIGGER IF EXISTS update_procedures_updated_at ON procedures_unpartitioned;
+DROP INDEX IF EXISTS idx_procedures_patient_id;
+DROP INDEX IF EXISTS idx_procedures_snomed;
+
+CREATE TABLE procedures (
+    id INTEGER NOT NULL DEFAULT nextval('procedures_id_seq'),
+    patient_id INTEGER NOT NULL REFERENCES patients(id) ON DELETE CASCADE,
+    procedure_name VARCHAR(255) NOT NULL,
+    procedure_type VARCHAR(100),
+    snomed_code VARCHAR(20),
+    procedure_date DATE,
+    location VARCHAR(255),
+    provider VARCHAR(255),
+    confidence FLOAT,
+    status VARCHAR(50) DEFAULT 'completed',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE procedures_default PARTITION OF procedures DEFAULT;
+
+CREATE INDEX idx_procedures_patient_created ON procedures(patient_id, created_at)
+    INCLUDE (snomed_code);
+CREATE INDEX idx_procedures_snomed_created ON procedures(snomed_code, created_at)
+    INCLUDE (patient_id);
+
+-- Keep ids from the existing sequence; it must change owner before the old table is dropped
+ALTER SEQUENCE procedures_id_seq OWNED BY procedures.id;
+
+CREATE TRIGGER update_procedures_updated_at BEFORE UPDATE ON procedures
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+COMMENT ON TABLE procedures IS 'Medical procedures and tests';
+
+-- Partitions for every month holding data, through three months ahead
+SELECT create_entity_partitions(
+    LEAST(
+        (SELECT MIN(COALESCE(created_at, updated_at, NOW())) FROM diagnoses_unpartitioned),
+        (SELECT MIN(COALESCE(created_at, updated_at, NOW())) FROM medications_unpartitioned),
+        (SELECT MIN(COALESCE(created_at, updated_at, NOW())) FROM procedures_unpartitioned),
+        NOW()
+    )::date,
+    (CURRENT_DATE + INTERVAL '3 months')::date
+);
+
+INSERT INTO diagnoses
+SELECT id, patient_id, diagnosis_text, icd10_code, snomed_code, confidence,
+       diagnosis_date, status, COALESCE(created_at, updated_at, NOW()), updated_at
+FROM diagnoses_unpartitioned;
+
+INSERT INTO medications
+SELECT id, patient_id, medication_name, rxnorm_code, dosage, frequency, route,
+       start_date, end_date, confidence, status, COALESCE(created_at, updated_at, NOW()), updated_at
+FROM medications_unpartitioned;
+
+INSERT INTO procedures
+SELECT id, patient_id, procedure_name, procedure_type, snomed_code, procedure_date,
+       location, provider, confidence, status, COALESCE(created_at, updated_at, NOW()), updated_at
+FROM procedures_unpartitioned;
+
+DROP TABLE diagnoses_unpartitioned;
+DROP TABLE medications_unpartitioned;
+DROP TABLE procedures_unpartitioned;
+
+\ir summary_tables.sql
+
+SELECT rebuild_summary_tables();
+
+ANALYZE diagnoses;
+ANALYZE medications;
+ANALYZE procedures;
+
+COMMIT;
@@ -27,9 +27,14 @@ CREATE TABLE IF NOT EXISTS patients (
 -- Create index on MRN
 CREATE INDEX idx_patients_mrn ON patients(mrn);
 
+-- Entity tables are range partitioned by month on created_at. Partitions are
+-- created ahead of time (and optionally expired) by create_entity_partitions()
+-- and drop_expired_entity_partitions(), run from the partition maintenance job.
+-- The DEFAULT partitions only catch rows outside the prepared range.
+
 -- Diagnoses table
 CREATE TABLE IF NOT EXISTS diagnoses (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     patient_id INTEGER NOT NULL REFERENCES patients(id) ON DELETE CASCADE,
     diagnosis_text TEXT NOT NULL,
     icd10_code VARCHAR(10),
@@ -37,18 +42,24 @@ CREATE TABLE IF NOT EXISTS diagnoses (
     confidence FLOAT,
     diagnosis_date DATE,
     status VARCHAR(50) DEFAULT 'active',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS diagnoses_default PARTITION OF diagnoses DEFAULT;
 
 -- Create indexes
-CREATE INDEX idx_diagnoses_patient_id ON diagnoses(patient_id);
-CREATE INDEX idx_diagnoses_icd10 ON diagnoses(icd10_code);
+-- Per-patient recent history and code frequency over a date window
+CREATE INDEX idx_diagnoses_patient_created ON diagnoses(patient_id, created_at)
+    INCLUDE (icd10_code, snomed_code);
+CREATE INDEX idx_diagnoses_icd10_created ON diagnoses(icd10_code, created_at)
+    INCLUDE (patient_id);
 CREATE INDEX idx_diagnoses_snomed ON diagnoses(snomed_code);
 
 -- Medications table
 CREATE TABLE IF NOT EXISTS medications (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     patient_id INTEGER NOT NULL REFERENCES patients(id) ON DELETE CASCADE,
     medication_name VARCHAR(255) NOT NULL,
     rxnorm_code VARCHAR(20),
@@ -59,17 +70,22 @@ CREATE TABLE IF NOT EXISTS medications (
     end_date DATE,
     confidence FLOAT,
     status VARCHAR(50) DEFAULT 'active',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS medications_default PARTITION OF medications DEFAULT;
 
 -- Create indexes
-CREATE INDEX idx_medications_patient_id ON medications(patient_id);
-CREATE INDEX idx_medications_rxnorm ON medications(rxnorm_code);
+CREATE INDEX idx_medications_patient_created ON medications(patient_id, created_at)
+    INCLUDE (rxnorm_code);
+CREATE INDEX idx_medications_rxnorm_created ON medications(rxnorm_code, created_at)
+    INCLUDE (patient_id);
 
 -- Procedures table
 CREATE TABLE IF NOT EXISTS procedures (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     patient_id INTEGER NOT NULL REFERENCES patients(id) ON DELETE CASCADE,
     procedure_name VARCHAR(255) NOT NULL,
     procedure_type VARCHAR(100),
@@ -79,13 +95,18 @@ CREATE TABLE IF NOT EXISTS procedures (
     provider VARCHAR(255),
     confidence FLOAT,
     status VARCHAR(50) DEFAULT 'completed',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS procedures_default PARTITION OF procedures DEFAULT;
 
 -- Create indexes
-CREATE INDEX idx_procedures_patient_id ON procedures(patient_id);
-CREATE INDEX idx_procedures_snomed ON procedures(snomed_code);
+CREATE INDEX idx_procedures_patient_created ON procedures(patient_id, created_at)
+    INCLUDE (snomed_code);
+CREATE INDEX idx_procedures_snomed_created ON procedures(snomed_code, created_at)
+    INCLUDE (patient_id);
 
 -- Referrals table (audit trail)
 CREATE TABLE IF NOT EXISTS referrals (
@@ -122,38 +143,8 @@ CREATE TABLE IF NOT EXISTS extraction_logs (
 -- Create index
 CREATE INDEX idx_extraction_logs_referral_id ON extraction_logs(referral_id);
 
--- Create views for analytics
-
--- View: Patient Summary
-CREATE OR REPLACE VIEW patient_summary AS
-SELECT 
-    p.id,
-    p.mrn,
-    p.name,
-    p.dob,
-    COUNT(DISTINCT d.id) as diagnosis_count,
-    COUNT(DISTINCT m.id) as medication_count,
-    COUNT(DISTINCT pr.id) as procedure_count,
-    MAX(r.received_date) as last_referral_date
-FROM patients p
-LEFT JOIN diagnoses d ON p.id = d.patient_id
-LEFT JOIN medications m ON p.id = m.patient_id
-LEFT JOIN procedures pr ON p.id = pr.patient_id
-LEFT JOIN referrals r ON p.id = r.patient_id
-GROUP BY p.id, p.mrn, p.name, p.dob;
-
--- View: Processing Statistics
-CREATE OR REPLACE VIEW processing_stats AS
-SELECT 
-    DATE(created_at) as date,
-    COUNT(*) as total_referrals,
-    COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed,
-    COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed,
-    COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending,
-    AVG(EXTRACT(EPOCH FROM (processed_date - received_date))) as avg_processing_time_seconds
-FROM referrals
-GROUP BY DATE(created_at)
-ORDER BY date DESC;
+-- Materialized summary tables and analytics views
+\ir summary_tables.sql
 
 -- Grants (adjust as needed)
 -- GRANT SELECT, INSERT, UPDATE ON ALL TABLES IN SCHEMA public TO medextract_app;
@@ -178,6 +169,9 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Partition maintenance functions
+\ir partition_functions.sql
+
 -- Create triggers for updated_at
 CREATE TRIGGER update_patients_updated_at BEFORE UPDATE ON patients
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -194,4 +188,7 @@ CREATE TRIGGER update_procedures_updated_at BEFORE UPDATE ON procedures
 CREATE TRIGGER update_referrals_updated_at BEFORE UPDATE ON referrals
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Initial partitions: current month plus three months ahead
+SELECT create_entity_partitions(CURRENT_DATE, (CURRENT_DATE + INTERVAL '3 months')::date);
+
 COMMIT;
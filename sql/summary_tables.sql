@@ -0,0 +1,122 @@
+-- MedExtract Pipeline: materialized summary tables and views
+-- Included by schema.sql and partition_migration.sql; safe to re-run.
+
+-- Materialized summary tables
+-- Maintained incrementally by the loader in the same transaction as the
+-- entity inserts; rebuild with rebuild_summary_tables()
+
+-- Per-patient entity counters
+CREATE TABLE IF NOT EXISTS patient_summary_counts (
+    patient_id INTEGER PRIMARY KEY REFERENCES patients(id) ON DELETE CASCADE,
+    diagnosis_count INTEGER NOT NULL DEFAULT 0,
+    medication_count INTEGER NOT NULL DEFAULT 0,
+    procedure_count INTEGER NOT NULL DEFAULT 0,
+    last_referral_date TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Daily referral processing counters, keyed by DATE(referrals.created_at).
+-- Each day is split over several shard rows (chosen at random by the loader)
+-- so concurrent loads do not serialize on one row; readers sum the shards.
+CREATE TABLE IF NOT EXISTS processing_stats_daily (
+    date DATE NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    total_referrals INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    pending INTEGER NOT NULL DEFAULT 0,
+    processing_time_sum_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    processing_time_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (date, shard)
+);
+
+-- Create views for analytics
+
+-- View: Patient Summary
+CREATE OR REPLACE VIEW patient_summary AS
+SELECT 
+    p.id,
+    p.mrn,
+    p.name,
+    p.dob,
+    COALESCE(s.diagnosis_count, 0) as diagnosis_count,
+    COALESCE(s.medication_count, 0) as medication_count,
+    COALESCE(s.procedure_count, 0) as procedure_count,
+    s.last_referral_date
+FROM patients p
+LEFT JOIN patient_summary_counts s ON p.id = s.patient_id;
+
+-- View: Processing Statistics
+CREATE OR REPLACE VIEW processing_stats AS
+SELECT 
+    date,
+    SUM(total_referrals) as total_referrals,
+    SUM(completed) as completed,
+    SUM(failed) as failed,
+    SUM(pending) as pending,
+    SUM(processing_time_sum_seconds) / NULLIF(SUM(processing_time_count), 0) as avg_processing_time_seconds
+FROM processing_stats_daily
+GROUP BY date
+ORDER BY date DESC;
+
+-- Full aggregations over the base tables, used to rebuild and verify the
+-- summary tables (expensive; not for dashboard queries)
+
+-- View: Patient Summary (live)
+CREATE OR REPLACE VIEW patient_summary_live AS
+SELECT 
+    p.id as patient_id,
+    COALESCE(d.n, 0) as diagnosis_count,
+    COALESCE(m.n, 0) as medication_count,
+    COALESCE(pr.n, 0) as procedure_count,
+    r.last_referral_date
+FROM patients p
+LEFT JOIN (SELECT patient_id, COUNT(*) as n FROM diagnoses GROUP BY patient_id) d
+    ON p.id = d.patient_id
+LEFT JOIN (SELECT patient_id, COUNT(*) as n FROM medications GROUP BY patient_id) m
+    ON p.id = m.patient_id
+LEFT JOIN (SELECT patient_id, COUNT(*) as n FROM procedures GROUP BY patient_id) pr
+    ON p.id = pr.patient_id
+LEFT JOIN (SELECT patient_id, MAX(received_date) as last_referral_date FROM referrals GROUP BY patient_id) r
+    ON p.id = r.patient_id;
+
+-- View: Processing Statistics (live)
+CREATE OR REPLACE VIEW processing_stats_live AS
+SELECT 
+    DATE(created_at) as date,
+    COUNT(*) as total_referrals,
+    COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed,
+    COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed,
+    COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending,
+    COALESCE(SUM(EXTRACT(EPOCH FROM (processed_date - received_date))), 0) as processing_time_sum_seconds,
+    COUNT(processed_date - received_date) as processing_time_count
+FROM referrals
+GROUP BY DATE(created_at);
+
+COMMENT ON TABLE patient_summary_counts IS 'Incrementally maintained per-patient entity counts';
+COMMENT ON TABLE processing_stats_daily IS 'Incrementally maintained daily referral processing counters';
+
+-- Recompute summary tables from the base tables
+CREATE OR REPLACE FUNCTION rebuild_summary_tables()
+RETURNS VOID AS $$
+BEGIN
+    -- Same order as the loader, which updates processing_stats_daily before
+    -- patient_summary_counts, so the two cannot deadlock
+    LOCK TABLE processing_stats_daily, patient_summary_counts IN EXCLUSIVE MODE;
+
+    DELETE FROM patient_summary_counts;
+    INSERT INTO patient_summary_counts
+        (patient_id, diagnosis_count, medication_count, procedure_count, last_referral_date)
+    SELECT patient_id, diagnosis_count, medication_count, procedure_count, last_referral_date
+    FROM patient_summary_live;
+
+    DELETE FROM processing_stats_daily;
+    INSERT INTO processing_stats_daily
+        (date, total_referrals, completed, failed, pending,
+         processing_time_sum_seconds, processing_time_count)
+    SELECT date, total_referrals, completed, failed, pending,
+           processing_time_sum_seconds, processing_time_count
+    FROM processing_stats_live;
+END;
+$$ LANGUAGE plpgsql;
@@ -174,6 +174,7 @@ module "lambda" {
   dynamodb_table_arn = module.dynamodb.table_arn
   rds_endpoint       = module.rds.cluster_endpoint
   kms_key_arn        = aws_kms_key.medextract.arn
+  analytics_prefix   = var.analytics_prefix
 }
 
 module "ses" {
@@ -34,6 +34,11 @@ variable "kms_key_arn" {
   type = string
 }
 
+variable "analytics_prefix" {
+  type    = string
+  default = "analytics"
+}
+
 # IAM Role for Lambda functions
 resource "aws_iam_role" "lambda_exec" {
   name = "${var.project_name}-lambda-exec-role"
@@ -185,6 +190,12 @@ resource "aws_lambda_function" "comprehend_worker" {
     subnet_ids         = var.subnet_ids
     security_group_ids = var.security_group_ids
   }
+  
+  environment {
+    variables = {
+      SECTION_ROUTING = "on"
+    }
+  }
 }
 
 # Ontology Mapper Lambda
@@ -204,7 +215,8 @@ resource "aws_lambda_function" "ontology_mapper" {
   
   environment {
     variables = {
-      DYNAMODB_TABLE = split("/", var.dynamodb_table_arn)[1]
+      DYNAMODB_TABLE    = split("/", var.dynamodb_table_arn)[1]
+      EXPORTER_FUNCTION = "${var.project_name}-exporter"
     }
   }
 }
@@ -232,6 +244,167 @@ resource "aws_lambda_function" "postgres_loader" {
   }
 }
 
+# Partition Maintenance Lambda (ships in the loader package)
+resource "aws_lambda_function" "partition_maintenance" {
+  filename         = "${path.module}/../../../lambda/loader/deployment.zip"
+  function_name    = "${var.project_name}-partition-maintenance"
+  role             = aws_iam_role.lambda_exec.arn
+  handler          = "partition_maintenance.lambda_handler"
+  runtime          = "python3.11"
+  timeout          = 900
+  memory_size      = 512
+  
+  vpc_config {
+    subnet_ids         = var.subnet_ids
+    security_group_ids = var.security_group_ids
+  }
+  
+  # DB_PASSWORD or DB_SECRET_NAME is set after deployment, as for the loader
+  environment {
+    variables = {
+      DB_ENDPOINT                = var.rds_endpoint
+      DB_NAME                    = "medextract"
+      DB_USER                    = "medextract_admin"
+      PARTITION_MONTHS_AHEAD     = "3"
+      PARTITION_RETENTION_MONTHS = "0"
+      PARTITION_LOCK_TIMEOUT     = "5s"
+    }
+  }
+}
+
+# Daily partition creation/retention for the entity tables
+resource "aws_cloudwatch_event_rule" "partition_maintenance" {
+  name                = "${var.project_name}-partition-maintenance"
+  schedule_expression = "cron(0 3 * * ? *)"
+}
+
+resource "aws_cloudwatch_event_target" "partition_maintenance" {
+  rule = aws_cloudwatch_event_rule.partition_maintenance.name
+  arn  = aws_lambda_function.partition_maintenance.arn
+}
+
+resource "aws_lambda_permission" "partition_maintenance_invoke" {
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.partition_maintenance.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.partition_maintenance.arn
+}
+
+# IAM Role for the analytics exporter, limited to the analytics prefix
+# (compaction deletes the files it merges)
+resource "aws_iam_role" "analytics_exporter" {
+  name = "${var.project_name}-exporter-exec-role"
+  
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "lambda.amazonaws.com"
+        }
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "analytics_exporter_vpc" {
+  role       = aws_iam_role.analytics_exporter.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaVPCAccessExecutionRole"
+}
+
+resource "aws_iam_role_policy" "analytics_exporter_permissions" {
+  name = "${var.project_name}-exporter-permissions"
+  role = aws_iam_role.analytics_exporter.id
+  
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject",
+          "s3:DeleteObject"
+        ]
+        Resource = "${var.s3_bucket_arn}/${var.analytics_prefix}/*"
+      },
+      {
+        Effect   = "Allow"
+        Action   = "s3:ListBucket"
+        Resource = var.s3_bucket_arn
+        Condition = {
+          StringLike = {
+            "s3:prefix" = "${var.analytics_prefix}/*"
+          }
+        }
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "kms:Decrypt",
+          "kms:GenerateDataKey"
+        ]
+        Resource = var.kms_key_arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "logs:CreateLogGroup",
+          "logs:CreateLogStream",
+          "logs:PutLogEvents"
+        ]
+        Resource = "arn:aws:logs:*:*:*"
+      }
+    ]
+  })
+}
+
+# Analytics Exporter Lambda
+resource "aws_lambda_function" "analytics_exporter" {
+  filename         = "${path.module}/../../../lambda/analytics_exporter/deployment.zip"
+  function_name    = "${var.project_name}-exporter"
+  role             = aws_iam_role.analytics_exporter.arn
+  handler          = "exporter.lambda_handler"
+  runtime          = "python3.11"
+  timeout          = 900
+  memory_size      = 2048
+  
+  vpc_config {
+    subnet_ids         = var.subnet_ids
+    security_group_ids = var.security_group_ids
+  }
+  
+  environment {
+    variables = {
+      ANALYTICS_BUCKET = split(":", var.s3_bucket_arn)[5]
+      ANALYTICS_PREFIX = var.analytics_prefix
+    }
+  }
+}
+
+# Nightly compaction of the previous day's Parquet partitions
+resource "aws_cloudwatch_event_rule" "analytics_compaction" {
+  name                = "${var.project_name}-analytics-compaction"
+  schedule_expression = "cron(30 2 * * ? *)"
+}
+
+resource "aws_cloudwatch_event_target" "analytics_compaction" {
+  rule  = aws_cloudwatch_event_rule.analytics_compaction.name
+  arn   = aws_lambda_function.analytics_exporter.arn
+  input = jsonencode({ action = "compact" })
+}
+
+resource "aws_lambda_permission" "compaction_invoke" {
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.analytics_exporter.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.analytics_compaction.arn
+}
+
 # Lambda permission for SES
 resource "aws_lambda_permission" "ses_invoke" {
   statement_id  = "AllowExecutionFromSES"
@@ -263,3 +436,7 @@ output "mapper_arn" {
 output "loader_arn" {
   value = aws_lambda_function.postgres_loader.arn
 }
+
+output "exporter_arn" {
+  value = aws_lambda_function.analytics_exporter.arn
+}
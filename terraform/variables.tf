@@ -40,6 +40,12 @@ variable "enable_cloudtrail" {
   default     = true
 }
 
+variable "analytics_prefix" {
+  description = "S3 key prefix for analytics Parquet exports"
+  type        = string
+  default     = "analytics"
+}
+
 variable "vpc_cidr" {
   description = "CIDR block for VPC"
   type        = string
@@ -0,0 +1,13 @@
+"""
+Shared test setup: makes the Lambda modules importable the way they are
+packaged, each from its own directory
+"""
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The Lambda modules create boto3 clients at import time
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+for lambda_dir in ('shared', 'comprehend_worker', 'analytics_exporter', 'loader'):
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'lambda', lambda_dir))
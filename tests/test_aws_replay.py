@@ -0,0 +1,156 @@
+"""Tests for the AWS record/replay layer"""
+import boto3
+import pytest
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+import aws_replay
+
+RESPONSE = {
+    'Entities': [{
+        'Id': 0, 'BeginOffset': 0, 'EndOffset': 9, 'Score': 0.9, 'Text': 'metformin',
+        'Category': 'MEDICATION', 'Type': 'GENERIC_NAME', 'Traits': [], 'Attributes': [],
+        'RxNormConcepts': [{'Description': 'metformin', 'Code': '6809', 'Score': 0.9}]
+    }],
+    'ModelVersion': '0.1.0'
+}
+
+
+def comprehend_client(**config):
+    return boto3.client(
+        'comprehendmedical',
+        region_name='us-east-1',
+        aws_access_key_id='testing',
+        aws_secret_access_key='testing',
+        config=Config(**config)
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return aws_replay.RecordingStore(str(tmp_path / 'recordings.db'))
+
+
+@pytest.fixture(autouse=True)
+def replay_settings(monkeypatch):
+    monkeypatch.setattr(aws_replay, '_latency_model', aws_replay.LatencyModel('none'))
+    monkeypatch.setattr(aws_replay, '_buckets', {})
+    monkeypatch.setattr(aws_replay, '_stats', {})
+    monkeypatch.setattr(aws_replay, 'REPLAY_RATE_LIMIT', 0)
+    monkeypatch.delenv('AWS_MAX_ATTEMPTS', raising=False)
+    monkeypatch.delenv('AWS_RETRY_MODE', raising=False)
+
+
+def test_request_key_ignores_parameter_order():
+    params = {'Document': {'S3Object': {'Bucket': 'b', 'Name': 'k'}}, 'FeatureTypes': []}
+    reordered = {'FeatureTypes': [], 'Document': {'S3Object': {'Name': 'k', 'Bucket': 'b'}}}
+
+    first = aws_replay.request_key('textract', 'DetectDocumentText', params)
+    second = aws_replay.request_key('textract', 'DetectDocumentText', reordered)
+
+    assert first == second
+    assert len(first) == 64
+
+
+def test_request_key_distinguishes_service_operation_and_params():
+    key = aws_replay.request_key('comprehendmedical', 'InferRxNorm', {'Text': 'x'})
+
+    assert key != aws_replay.request_key('comprehendmedical', 'InferICD10CM', {'Text': 'x'})
+    assert key != aws_replay.request_key('comprehend', 'InferRxNorm', {'Text': 'x'})
+    assert key != aws_replay.request_key('comprehendmedical', 'InferRxNorm', {'Text': 'y'})
+
+
+def test_record_then_replay_round_trip(store):
+    client = comprehend_client()
+    recorder = aws_replay.wrap_client(client, mode='record', store=store)
+
+    with Stubber(client) as stubber:
+        stubber.add_response('infer_rx_norm', RESPONSE, {'Text': 'metformin'})
+        recorded = recorder.infer_rx_norm(Text='metformin')
+        stubber.assert_no_pending_responses()
+
+    # Replay never reaches the service: no stubbed responses are queued
+    replayer = aws_replay.wrap_client(comprehend_client(), mode='replay', store=store)
+    replayed = replayer.infer_rx_norm(Text='metformin')
+
+    assert replayed['Entities'] == recorded['Entities'] == RESPONSE['Entities']
+    assert aws_replay.replay_stats()['comprehendmedical.InferRxNorm']['calls'] == 1
+
+
+def test_replay_miss_raises(store):
+    replayer = aws_replay.wrap_client(comprehend_client(), mode='replay', store=store)
+
+    with pytest.raises(aws_replay.ReplayMissError):
+        replayer.infer_rx_norm(Text='never recorded')
+
+    assert aws_replay.replay_stats()['comprehendmedical.InferRxNorm']['missing'] == 1
+
+
+def test_off_mode_returns_client_unchanged():
+    client = comprehend_client()
+
+    assert aws_replay.wrap_client(client, mode='off') is client
+
+
+def test_throttled_replay_retries_then_raises(store, monkeypatch):
+    store.put(
+        aws_replay.request_key('comprehendmedical', 'InferRxNorm', {'Text': 'metformin'}),
+        'comprehendmedical', 'InferRxNorm', 0.0, RESPONSE
+    )
+    sleeps = []
+    monkeypatch.setattr(aws_replay.time, 'sleep', sleeps.append)
+    monkeypatch.setattr(aws_replay, 'REPLAY_RATE_LIMIT', 0.001)
+    monkeypatch.setattr(aws_replay, 'REPLAY_BURST', 1)
+
+    replayer = aws_replay.wrap_client(
+        comprehend_client(retries={'mode': 'standard'}), mode='replay', store=store
+    )
+
+    # The burst allows one request; the next uses up all three attempts
+    assert replayer.infer_rx_norm(Text='metformin')['Entities'] == RESPONSE['Entities']
+    with pytest.raises(ClientError) as error:
+        replayer.infer_rx_norm(Text='metformin')
+
+    assert error.value.response['Error']['Code'] == 'ThrottlingException'
+    assert error.value.response['ResponseMetadata']['RetryAttempts'] == 2
+    assert len(sleeps) == 2
+    assert all(0 <= s <= aws_replay.MAX_BACKOFF_SECONDS for s in sleeps)
+    assert aws_replay.replay_stats()['comprehendmedical.InferRxNorm'] == {
+        'calls': 2, 'retries': 2, 'throttled': 1, 'missing': 0
+    }
+
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(aws_replay.time, 'monotonic', lambda: now[0])
+    bucket = aws_replay.TokenBucket(rate=2, burst=2)
+
+    assert bucket.acquire() and bucket.acquire()
+    assert not bucket.acquire()
+
+    now[0] += 0.5
+    assert bucket.acquire()
+    assert not bucket.acquire()
+
+
+def test_backoff_grows_with_attempt_and_is_capped():
+    assert 0 <= aws_replay.backoff_seconds(1) <= 1
+    assert 0 <= aws_replay.backoff_seconds(3) <= 4
+    assert 0 <= aws_replay.backoff_seconds(30) <= aws_replay.MAX_BACKOFF_SECONDS
+
+
+@pytest.mark.parametrize('config, env, expected', [
+    ({}, {}, 5),
+    ({'retries': {'mode': 'standard'}}, {}, 3),
+    ({'retries': {'mode': 'adaptive'}}, {}, 3),
+    ({}, {'AWS_RETRY_MODE': 'standard'}, 3),
+    ({}, {'AWS_MAX_ATTEMPTS': '7'}, 7),
+    ({'retries': {'max_attempts': 2}}, {}, 3),
+    ({'retries': {'total_max_attempts': 4}}, {'AWS_MAX_ATTEMPTS': '7'}, 4),
+])
+def test_retry_policy(config, env, expected, monkeypatch):
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+
+    assert aws_replay.retry_policy(comprehend_client(**config)) == expected
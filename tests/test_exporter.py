@@ -0,0 +1,163 @@
+"""Tests for the analytics exporter's row building, batching and compaction"""
+import io
+from datetime import date, datetime
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import exporter  # noqa: E402
+
+EXPORTED_AT = datetime(2024, 1, 15, 9, 30)
+
+
+def objects(*sizes):
+    return [{'Key': f"k{i}", 'Size': size} for i, size in enumerate(sizes)]
+
+
+def test_batch_by_size_starts_new_batch_at_target():
+    batches = exporter.batch_by_size(objects(40, 40, 40, 10), 100)
+
+    assert [[obj['Key'] for obj in batch] for batch in batches] == [['k0', 'k1'], ['k2', 'k3']]
+
+
+def test_batch_by_size_keeps_oversized_object_alone():
+    batches = exporter.batch_by_size(objects(10, 150, 10), 100)
+
+    assert [[obj['Key'] for obj in batch] for batch in batches] == [['k0'], ['k1'], ['k2']]
+
+
+def test_batch_by_size_empty():
+    assert exporter.batch_by_size([], 100) == []
+
+
+def test_build_rows_flattens_entities_to_schema():
+    data = {
+        'patient': {'mrn': 'MRN1'},
+        'diagnoses': [
+            {'text': 'Type 2 Diabetes', 'icd10_code': 'E11.9', 'confidence': '0.95', 'extra': 'x'},
+            {'text': 'Hypertension'}
+        ]
+    }
+
+    rows = exporter.build_rows('diagnosis', data, 'msg-1', EXPORTED_AT)
+
+    assert rows[0] == {
+        'message_id': 'msg-1',
+        'patient_mrn': 'MRN1',
+        'exported_at': EXPORTED_AT,
+        'text': 'Type 2 Diabetes',
+        'icd10_code': 'E11.9',
+        'snomed_code': None,
+        'description': None,
+        'confidence': 0.95
+    }
+    assert rows[1]['confidence'] is None
+    assert set(rows[1]) == set(exporter.ENTITY_SCHEMAS['diagnosis'].names)
+
+
+def test_build_rows_defaults_mrn_to_message_id():
+    data = {'medications': [{'name': 'Metformin', 'rxnorm_code': '6809'}]}
+
+    rows = exporter.build_rows('medication', data, 'msg-2', EXPORTED_AT)
+
+    assert rows[0]['patient_mrn'] == 'msg-2'
+    assert exporter.build_rows('procedure', data, 'msg-2', EXPORTED_AT) == []
+
+
+class FakeS3:
+    """In-memory stand-in for the S3 calls compaction makes"""
+
+    def __init__(self):
+        self.objects = {}
+        self.fail_deletes = False
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key, Range=None):
+        body = self.objects[Key]
+        if Range:
+            body = body[int(Range.split('=')[1]):]
+        return {'Body': io.BytesIO(body)}
+
+    def delete_objects(self, Bucket, Delete):
+        if self.fail_deletes:
+            raise RuntimeError('Task timed out')
+        for obj in Delete['Objects']:
+            self.objects.pop(obj['Key'], None)
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        yield {
+            'Contents': [
+                {'Key': key, 'Size': len(body)}
+                for key, body in sorted(self.objects.items())
+                if key.startswith(Prefix)
+            ]
+        }
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(exporter, 's3_client', fake)
+    monkeypatch.setattr(exporter, 'COMPACTION_MIN_FILES', 2)
+    return fake
+
+
+def export(s3, message_id, day):
+    data = {'patient': {'mrn': 'MRN1'}, 'diagnoses': [{'text': 'x', 'icd10_code': 'E11.9'}] * 3}
+    rows = exporter.build_rows('diagnosis', data, message_id, EXPORTED_AT)
+    key = exporter.partition_key('diagnosis', day, f"{message_id}.parquet")
+    exporter.write_parquet('bucket', key, 'diagnosis', rows)
+
+
+def exported_rows(s3):
+    return sum(
+        exporter.pq.read_table(io.BytesIO(body)).num_rows
+        for body in s3.objects.values()
+    )
+
+
+def test_compaction_merges_and_records_sources(s3):
+    day = date(2024, 1, 15)
+    for i in range(4):
+        export(s3, f"msg-{i}", day)
+
+    result = exporter.compact_partition('bucket', 'diagnosis', day)
+
+    assert result == {'merged': 4, 'written': 1, 'cleaned': 0}
+    [key] = s3.objects
+    assert key.rsplit('/', 1)[-1].startswith('compacted-')
+    assert len(exporter.compacted_sources('bucket', key)) == 4
+    assert exported_rows(s3) == 12
+
+
+def test_compaction_retry_after_failed_delete_does_not_duplicate_rows(s3):
+    day = date(2024, 1, 15)
+    for i in range(4):
+        export(s3, f"msg-{i}", day)
+
+    s3.fail_deletes = True
+    with pytest.raises(RuntimeError):
+        exporter.compact_partition('bucket', 'diagnosis', day)
+    assert exported_rows(s3) == 24
+
+    s3.fail_deletes = False
+    export(s3, 'msg-late', day)
+    result = exporter.compact_partition('bucket', 'diagnosis', day)
+
+    assert result['cleaned'] == 4
+    assert exported_rows(s3) == 15
+
+
+def test_compacted_key_depends_only_on_sources():
+    day = date(2024, 1, 15)
+    key = exporter.compacted_key('diagnosis', day, ['a', 'b'])
+
+    assert key == exporter.compacted_key('diagnosis', day, ['a', 'b'])
+    assert key != exporter.compacted_key('diagnosis', day, ['a', 'c'])
+    assert key.startswith('analytics/entity_type=diagnosis/date=2024-01-15/compacted-')
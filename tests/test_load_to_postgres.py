@@ -0,0 +1,112 @@
+"""Tests for the loader's referral status and processing counter updates"""
+from datetime import date, datetime
+
+import pytest
+
+import load_to_postgres
+
+STATS_DATE = date(2024, 1, 15)
+RECEIVED = datetime(2024, 1, 15, 9, 0, 0)
+
+
+class FakeCursor:
+    """Cursor returning queued fetchone() results and recording statements"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((' '.join(sql.split()), params))
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+    def statement(self, prefix):
+        matches = [params for sql, params in self.executed if sql.startswith(prefix)]
+        return matches[0] if matches else None
+
+
+def stats_deltas(cursor):
+    """Counter deltas passed to the processing_stats_daily upsert"""
+    params = cursor.statement('INSERT INTO processing_stats_daily')
+    if params is None:
+        return None
+    names = ('total_referrals', 'completed', 'failed', 'pending',
+             'processing_time_sum_seconds', 'processing_time_count')
+    return dict(zip(names, params[2:]))
+
+
+@pytest.fixture(autouse=True)
+def single_shard(monkeypatch):
+    monkeypatch.setattr(load_to_postgres, 'PROCESSING_STATS_SHARDS', 1)
+
+
+def test_new_referral_completed_in_one_transaction():
+    processed = datetime(2024, 1, 15, 9, 0, 30)
+    cursor = FakeCursor(
+        (STATS_DATE,),                                  # inserted as pending
+        (1, 'pending', STATS_DATE, RECEIVED, None),
+        (processed,)
+    )
+
+    received = load_to_postgres.update_referral_status(
+        cursor, 'msg-1', 'completed', patient_id=7, received_at='2024-01-15T09:00:00+00:00'
+    )
+
+    assert received == RECEIVED
+    assert cursor.statement('INSERT INTO referrals') == ('msg-1', 7, '2024-01-15T09:00:00+00:00')
+    assert stats_deltas(cursor) == {
+        'total_referrals': 1,
+        'completed': 1,
+        'failed': 0,
+        'pending': 0,
+        'processing_time_sum_seconds': 30.0,
+        'processing_time_count': 1
+    }
+
+
+def test_failed_then_completed_retry_moves_counts_and_replaces_processing_time():
+    first_processed = datetime(2024, 1, 15, 9, 0, 10)
+    retry_processed = datetime(2024, 1, 15, 9, 5, 0)
+    cursor = FakeCursor(
+        None,                                           # referral already recorded
+        (1, 'failed', STATS_DATE, RECEIVED, first_processed),
+        (retry_processed,)
+    )
+
+    load_to_postgres.update_referral_status(cursor, 'msg-1', 'completed', patient_id=7)
+
+    assert stats_deltas(cursor) == {
+        'total_referrals': 0,
+        'completed': 1,
+        'failed': -1,
+        'pending': 0,
+        'processing_time_sum_seconds': 290.0,
+        'processing_time_count': 0
+    }
+
+
+def test_first_attempt_failure_counts_referral_as_failed():
+    cursor = FakeCursor(
+        (STATS_DATE,),
+        (1, 'pending', STATS_DATE, RECEIVED, None),
+        (datetime(2024, 1, 15, 9, 0, 5),)
+    )
+
+    load_to_postgres.update_referral_status(cursor, 'msg-1', 'failed')
+
+    deltas = stats_deltas(cursor)
+    assert (deltas['total_referrals'], deltas['failed'], deltas['pending']) == (1, 1, 0)
+
+
+def test_unchanged_counters_skip_stats_update():
+    cursor = FakeCursor(
+        None,
+        (1, 'completed', STATS_DATE, None, datetime(2024, 1, 15, 9, 0, 5)),
+        (datetime(2024, 1, 15, 9, 1, 0),)
+    )
+
+    load_to_postgres.update_referral_status(cursor, 'msg-1', 'completed')
+
+    assert stats_deltas(cursor) is None
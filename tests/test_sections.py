@@ -0,0 +1,171 @@
+"""Tests for referral section classification, routing and offset mapping"""
+import pytest
+
+import sections
+import worker
+
+FORWARDED = (
+    "Email Body:\n"
+    "Hi team, please see below.\n"
+    "\n"
+    "Kind regards,\n"
+    "Jane\n"
+    "From: Dr Patel\n"
+    "Sent: Tuesday, 16 January 2024 11:42\n"
+    "Dear colleague,\n"
+    "Known type 2 diabetes, stage 3 CKD, on metformin 1g BD and ramipril.\n"
+)
+
+REFERRAL = (
+    "Email Body:\n"
+    "Dear Diabetes Team,\n"
+    "\n"
+    "Patient Details:\n"
+    "Name: John Smith\n"
+    "\n"
+    "Clinical Summary:\n"
+    "Type 2 diabetes, started on ramipril last year.\n"
+    "\n"
+    "Current Medications:\n"
+    "- Metformin 500mg BD\n"
+    "\n"
+    "Kind regards,\n"
+    "Dr Thompson\n"
+    "\n"
+    "This email is confidential and intended solely for the addressee.\n"
+    "\n"
+    "If you have received this email in error please notify the sender.\n"
+)
+
+
+def section_of(text, fragment):
+    """Type of the section containing fragment"""
+    start = text.index(fragment)
+    for section in sections.split_sections(text):
+        if section['start'] <= start < section['end']:
+            return section['type']
+    raise AssertionError(f"{fragment!r} not in any section")
+
+
+def routed_text(text, api):
+    return ''.join(text[start:end] for start, end in sections.route_sections(text).get(api, []))
+
+
+@pytest.mark.parametrize('text', [FORWARDED, REFERRAL, '', 'no newline at end'])
+def test_sections_cover_text_contiguously(text):
+    result = sections.split_sections(text)
+
+    assert [s['start'] for s in result[1:]] == [s['end'] for s in result[:-1]]
+    assert (result[0]['start'] if result else 0) == 0
+    assert (result[-1]['end'] if result else 0) == len(text)
+
+
+def test_headings_classify_following_lines():
+    assert section_of(REFERRAL, 'Name: John Smith') == 'demographics'
+    assert section_of(REFERRAL, 'Type 2 diabetes') == 'history'
+    assert section_of(REFERRAL, '- Metformin') == 'medications'
+
+
+def test_forwarded_referral_after_sign_off_and_headers_is_routed():
+    clinical = 'Known type 2 diabetes, stage 3 CKD, on metformin 1g BD and ramipril.'
+
+    assert section_of(FORWARDED, 'Kind regards') == 'boilerplate'
+    assert section_of(FORWARDED, 'From: Dr Patel') == 'boilerplate'
+    assert section_of(FORWARDED, 'Dear colleague') == 'boilerplate'
+    assert section_of(FORWARDED, clinical) == 'other'
+    for api in sections.COMPREHEND_APIS:
+        assert clinical in routed_text(FORWARDED, api)
+
+
+def test_confidentiality_banner_covers_only_its_paragraph():
+    text = (
+        "Email Body:\n"
+        "This email and any attachments are confidential and intended solely for the addressee.\n"
+        "\n"
+        "Patient has type 2 diabetes.\n"
+    )
+
+    assert section_of(text, 'This email') == 'boilerplate'
+    assert 'type 2 diabetes' in routed_text(text, 'infer_icd10_cm')
+
+
+def test_trailing_disclaimer_paragraphs_are_not_sent():
+    for api in sections.COMPREHEND_APIS:
+        sent = routed_text(REFERRAL, api)
+        assert 'confidential' not in sent
+        assert 'received this email in error' not in sent
+
+
+def test_history_free_text_reaches_rx_norm():
+    assert 'started on ramipril' in routed_text(REFERRAL, 'infer_rx_norm')
+    assert 'Metformin 500mg' not in routed_text(REFERRAL, 'infer_icd10_cm')
+
+
+def test_join_spans_merges_adjacent_spans():
+    text = 'abcdefghij'
+
+    joined, segments = sections.join_spans(text, [(0, 3), (3, 6), (8, 10)])
+
+    assert joined == 'abcdef\nij'
+    assert segments == [(0, 0, 6), (7, 8, 2)]
+
+
+def test_offsets_round_trip_through_joined_request():
+    spans = sections.route_sections(REFERRAL)['infer_rx_norm']
+    joined, segments = sections.join_spans(REFERRAL, spans)
+
+    for seg_offset, original_start, length in segments:
+        for i in range(length):
+            original = sections.to_original_offset(segments, seg_offset + i)
+            assert original == original_start + i
+            assert REFERRAL[original] == joined[seg_offset + i]
+
+
+def test_remap_offsets_translates_entities_and_attributes():
+    text = 'Summary:\nType 2 diabetes\nSocial:\nNon-smoker\nMedication:\nMetformin 500mg\n'
+    spans = [
+        (text.index('Type'), text.index('Social')),
+        (text.index('Metformin'), len(text))
+    ]
+    joined, segments = sections.join_spans(text, spans)
+    begin = joined.index('Metformin')
+    dosage = joined.index('500mg')
+    response = {
+        'Entities': [{
+            'Text': 'Metformin',
+            'BeginOffset': begin,
+            'EndOffset': begin + 9,
+            'Attributes': [
+                {'Text': '500mg', 'BeginOffset': dosage, 'EndOffset': dosage + 5},
+                {'Text': 'no offsets'}
+            ]
+        }],
+        'ModelVersion': '0.1.0'
+    }
+
+    remapped = worker.remap_offsets(response, segments)
+    entity = remapped['Entities'][0]
+
+    assert text[entity['BeginOffset']:entity['EndOffset']] == 'Metformin'
+    attribute = entity['Attributes'][0]
+    assert text[attribute['BeginOffset']:attribute['EndOffset']] == '500mg'
+    assert entity['Attributes'][1] == {'Text': 'no offsets'}
+    assert remapped['ModelVersion'] == '0.1.0'
+    assert response['Entities'][0]['BeginOffset'] == begin
+
+
+def test_validate_routing_accepts_known_names():
+    routing = {'social': ['detect_entities_v2', 'infer_icd10_cm'], 'boilerplate': []}
+
+    assert sections.validate_routing(routing) is routing
+
+
+@pytest.mark.parametrize('routing, message', [
+    (['history'], 'must map section types'),
+    ({'footer': []}, 'Unknown section type'),
+    ({'history': 'infer_rx_norm'}, 'must be a list'),
+    ({'history': ['infer_icd10']}, 'Unknown Comprehend Medical API'),
+])
+def test_validate_routing_rejects_unknown_names(routing, message):
+    with pytest.raises(ValueError, match=message):
+        sections.validate_routing(routing)